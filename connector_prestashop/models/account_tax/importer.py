@@ -12,6 +12,15 @@ class AccountTaxImporter(AutoMatchingImporter):
     _erp_field = 'amount'
     _ps_field = 'rate'
 
+    def _index_key(self, value):
+        # rates match with a tolerance of 0.01, compare with the
+        # neighbour keys too
+        return int(round(float(value) * 100))
+
+    def _candidate_keys(self, ps_val):
+        key = self._index_key(ps_val)
+        return [key - 1, key, key + 1]
+
     def _compare_function(self, ps_val, erp_val, ps_dict, erp_dict):
         if self.backend_record.taxes_included and erp_dict['price_include']:
             taxes_inclusion_test = True
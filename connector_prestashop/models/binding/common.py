@@ -3,6 +3,7 @@
 
 from odoo import models, fields, api
 from odoo.addons.queue_job.job import job
+from ...unit.binder import invalidate_bindings
 from ...unit.importer import PrestashopImporter, BatchImporter
 from ...unit.importer import import_record
 
@@ -33,6 +34,13 @@ class PrestashopBinding(models.AbstractModel):
         importer = env.get_connector_unit(PrestashopImporter)
         return importer.run(prestashop_id, **kwargs)
 
+    @job(default_channel='root.prestashop')
+    def import_records(self, backend, prestashop_ids, **kwargs):
+        """ Import a chunk of records from PrestaShop """
+        env = backend.get_environment(self._name)
+        importer = env.get_connector_unit(BatchImporter)
+        return importer.import_chunk(prestashop_ids, **kwargs)
+
     @job(default_channel='root.prestashop')
     def import_batch(self, backend=None, filters=None, **kwargs):
         """ Prepare a batch import of records from PrestaShop """
@@ -40,6 +48,11 @@ class PrestashopBinding(models.AbstractModel):
         importer = env.get_connector_unit(BatchImporter)
         return importer.run(filters=filters, **kwargs)
 
+    @api.multi
+    def unlink(self):
+        invalidate_bindings(self)
+        return super(PrestashopBinding, self).unlink()
+
     @api.multi
     def resync(self):
         func = import_record
@@ -47,7 +60,7 @@ class PrestashopBinding(models.AbstractModel):
             func = import_record.delay
         for record in self:
             func(self.env, self._name, record.backend_id.id,
-                 record.prestashop_id)
+                 record.prestashop_id, force=True)
         return True
 
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
+from odoo import _
 from odoo.addons.connector.unit.mapper import ImportMapper, mapping
 from ...unit.importer import PrestashopImporter, DelayedBatchImporter
 from ...backend import prestashop
@@ -59,7 +60,9 @@ class MailMessageImporter(PrestashopImporter):
             return 'no id_order'
         binder = self.binder_for('prestashop.sale.order')
         order_binding = binder.to_internal(record['id_order'])
-        return record['id_order'] == '0' or not order_binding
+        if record['id_order'] == '0' or not order_binding:
+            return _('The order %s is not imported.') % record['id_order']
+        return super(MailMessageImporter, self)._has_to_skip()
 
 
 @prestashop
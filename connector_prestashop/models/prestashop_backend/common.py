@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+import json
 import logging
 from contextlib import contextmanager
 
 from odoo import models, fields, api, exceptions, _
 
+from odoo.addons.queue_job.job import job
 from odoo.addons.connector.connector import ConnectorEnvironment
 from ...unit.importer import import_batch, import_record
 from ...unit.auto_matching_importer import AutoMatchingImporter
@@ -13,7 +15,10 @@ from ...unit.backend_adapter import GenericAdapter, api_handle_errors
 from ...unit.version_key import VersionKey
 from ...backend import prestashop
 
-from ..product_template.exporter import export_product_quantities
+from ..product_template.exporter import (
+    ProductInventoryBulkExporter,
+    export_product_quantities,
+)
 from ..product_template.importer import import_inventory
 from ..res_partner.importer import import_customers_since
 from ..delivery_carrier.importer import import_carriers
@@ -49,6 +54,15 @@ class PrestashopBackend(models.Model):
         string='Version',
         required=True,
     )
+    output_format = fields.Selection(
+        selection=[('xml', 'XML'),
+                   ('json', 'JSON')],
+        string='Webservice Format',
+        default='xml',
+        required=True,
+        help="Format of the responses of the webservice. JSON needs "
+             "PrestaShop 1.7 or later and is faster to decode.",
+    )
     location = fields.Char('Location')
     webservice_key = fields.Char(
         string='Webservice key',
@@ -66,6 +80,13 @@ class PrestashopBackend(models.Model):
         string='Stock Location',
         help='Location used to import stock quantities.'
     )
+    stock_export_delay = fields.Integer(
+        string='Stock Export Delay',
+        default=60,
+        help="Seconds to wait before exporting the quantities of the "
+             "products whose stock changed, the changes made meanwhile "
+             "are exported together.",
+    )
     pricelist_id = fields.Many2one(
         comodel_name='product.pricelist',
         string='Pricelist',
@@ -115,6 +136,24 @@ class PrestashopBackend(models.Model):
         required=True,
         string='Shipping Product',
     )
+    payment_retry_interval = fields.Integer(
+        string='Unpaid Orders Retry Interval',
+        default=10,
+        help="Minutes to wait before checking again the payments of an "
+             "order which is imported only once paid.",
+    )
+    http_pool_size = fields.Integer(
+        string='HTTP Connections',
+        default=4,
+        help="Maximum number of keep-alive connections opened to "
+             "PrestaShop by each worker process.",
+    )
+    http_pool_idle_timeout = fields.Integer(
+        string='HTTP Idle Timeout',
+        default=300,
+        help="Seconds after which an unused connection to PrestaShop "
+             "is closed.",
+    )
 
     @api.model
     def _default_pricelist_id(self):
@@ -200,10 +239,66 @@ class PrestashopBackend(models.Model):
         for backend_record in self:
             backend_record.env['prestashop.product.template']\
                 .with_delay().export_product_quantities(backend=backend_record)
-            backend_record.env['prestashop.product.combination']\
-                .with_delay().export_product_quantities(backend=backend_record)
         return True
 
+    @api.multi
+    def schedule_dirty_quantities_export(self):
+        """ Delay the export of the queued quantities, unless a job
+        waiting to be executed will already export them
+
+        Only the pending jobs are considered: a job already enqueued may
+        have read the queue before the current transaction is committed.
+        """
+        pending_jobs = self.env['queue.job'].sudo().search([
+            ('model_name', '=', self._name),
+            ('method_name', '=', 'export_dirty_quantities'),
+            ('state', '=', 'pending'),
+        ])
+        scheduled_ids = set()
+        for pending_job in pending_jobs:
+            scheduled_ids.update(pending_job.record_ids)
+        for backend_record in self:
+            if backend_record.id in scheduled_ids:
+                continue
+            backend_record.with_delay(
+                eta=backend_record.stock_export_delay,
+            ).export_dirty_quantities()
+        return True
+
+    @api.multi
+    @job(default_channel='root.prestashop')
+    def export_dirty_quantities(self):
+        """ Recompute and export the quantities of the queued products
+
+        The quantities of the templates and combinations of the products
+        are exported at once, only the ones which changed are written.
+        """
+        queue_model = self.env['prestashop.stock.queue']
+        results = []
+        for backend_record in self:
+            entries = queue_model.search([
+                ('backend_id', '=', backend_record.id),
+            ])
+            products = entries.mapped('product_id')
+            entries.unlink()
+            combinations = products.mapped('prestashop_bind_ids').filtered(
+                lambda x: x.backend_id == backend_record)
+            templates = products.mapped(
+                'product_tmpl_id.prestashop_bind_ids'
+            ).filtered(lambda x: x.backend_id == backend_record)
+            # no export by the consumers, they are exported below
+            combinations.with_context(
+                connector_no_export=True
+            ).recompute_prestashop_qty()
+            templates.with_context(
+                connector_no_export=True
+            ).recompute_prestashop_qty()
+            env = backend_record.get_environment(templates._name)
+            exporter = env.get_connector_unit(ProductInventoryBulkExporter)
+            results.append(exporter.run(templates=templates,
+                                        combinations=combinations))
+        return '\n'.join(results)
+
     @api.multi
     def import_stock_qty(self):
         for backend_record in self:
@@ -247,6 +342,15 @@ class PrestashopBackend(models.Model):
     def _scheduler_update_product_stock_qty(self, domain=None):
         self.search(domain or []).update_product_stock_qty()
 
+    @api.model
+    def _scheduler_export_dirty_quantities(self, domain=None):
+        self.env.cr.execute(
+            "SELECT DISTINCT backend_id FROM prestashop_stock_queue"
+        )
+        backend_ids = [row[0] for row in self.env.cr.fetchall()]
+        domain = (domain or []) + [('id', 'in', backend_ids)]
+        self.search(domain).schedule_dirty_quantities_export()
+
     @api.model
     def _scheduler_import_sale_orders(self, domain=None):
         self.search(domain or []).import_sale_orders()
@@ -277,7 +381,7 @@ class PrestashopBackend(models.Model):
     def import_record(self, model_name, ext_id):
         self.ensure_one()
         session = ConnectorSession.from_env(self.env)
-        import_record(session, model_name, self.id, ext_id)
+        import_record(session, model_name, self.id, ext_id, force=True)
         return True
 
 
@@ -300,6 +404,57 @@ class PrestashopShopGroup(models.Model):
     )
 
 
+class PrestashopImportCursor(models.Model):
+    """ Position of a batch import paginated on the ids
+
+    Stores the last id imported by a batch import for a backend, a model
+    and a set of filters, so an interrupted batch import restarts after
+    the last imported page.
+    """
+    _name = 'prestashop.import.cursor'
+    _description = 'PrestaShop Batch Import Cursor'
+
+    backend_id = fields.Many2one(
+        comodel_name='prestashop.backend',
+        string='PrestaShop Backend',
+        required=True,
+        ondelete='cascade',
+    )
+    model_name = fields.Char(string='Model', required=True)
+    filters_key = fields.Char(string='Filters', required=True)
+    last_id = fields.Integer(string='Last imported ID on PrestaShop')
+
+    _sql_constraints = [
+        ('cursor_uniq', 'unique(backend_id, model_name, filters_key)',
+         'A cursor already exists for this import.'),
+    ]
+
+    @api.model
+    def _filters_key(self, filters):
+        """ Filters identifying a batch import, without the pagination """
+        filters = dict(
+            (key, value) for key, value in filters.iteritems()
+            if key not in ('limit', 'sort', 'filter[id]')
+        )
+        return json.dumps(filters, sort_keys=True)
+
+    @api.model
+    def get_cursor(self, backend, model_name, filters):
+        """ Return the cursor of a batch import, create it if needed """
+        values = {
+            'backend_id': backend.id,
+            'model_name': model_name,
+            'filters_key': self._filters_key(filters),
+        }
+        cursor = self.search(
+            [(key, '=', value) for key, value in values.iteritems()],
+            limit=1,
+        )
+        if not cursor:
+            cursor = self.create(values)
+        return cursor
+
+
 @prestashop
 class NoModelAdapter(GenericAdapter):
     """ Used to test the connection """
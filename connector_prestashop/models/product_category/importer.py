@@ -5,7 +5,13 @@ from odoo import _
 from odoo.addons.connector.unit.mapper import (mapping,
                                                   ImportMapper)
 from odoo.addons.connector.unit.mapper import external_to_m2o
-from ...unit.importer import TranslatableRecordImporter, DelayedBatchImporter
+from odoo.addons.queue_job.exception import RetryableJobError
+from ...unit.cache import clear_job_caches
+from ...unit.importer import (
+    DelayedBatchImporter,
+    PrestashopImporter,
+    TranslatableRecordImporter,
+)
 from ...backend import prestashop
 
 import datetime
@@ -46,10 +52,15 @@ class ProductCategoryMapper(ImportMapper):
     def parent_id(self, record):
         if record['id_parent'] == '0':
             return {}
-        category = self.binder_for('prestashop.product.category').to_internal(
-            record['id_parent'], unwrap=True)
+        # categories by PrestaShop id given by the import of the tree
+        parent_ids = self.options.get('parent_ids') or {}
+        parent_id = parent_ids.get(int(record['id_parent']))
+        if parent_id is None:
+            parent_id = self.binder_for(
+                'prestashop.product.category'
+            ).to_internal(record['id_parent'], unwrap=True).id
         return {
-            'parent_id': category.id,
+            'parent_id': parent_id,
         }
 
     @mapping
@@ -82,6 +93,84 @@ class ProductCategoryImporter(TranslatableRecordImporter):
         ],
     }
 
+    def __init__(self, environment):
+        """
+        :param environment: current environment (backend, session, ...)
+        :type environment: :py:class:`connector.connector.ConnectorEnvironment`
+        """
+        super(ProductCategoryImporter, self).__init__(environment)
+        # Odoo categories by PrestaShop id, see ``import_tree``
+        self.parent_ids = None
+
+    def _create_data(self, map_record):
+        return map_record.values(for_create=True, parent_ids=self.parent_ids)
+
+    def _update_data(self, map_record):
+        return map_record.values(parent_ids=self.parent_ids)
+
+    def import_tree(self, records, **kwargs):
+        """ Import categories in one pass, parents first
+
+        The existing bindings of the categories and of their parents are
+        searched with one query, and the parents are then taken from the
+        categories imported before them. The new categories are locked
+        and checked in a new transaction at once. Each category is
+        imported in a savepoint, without the lock, the check and the
+        dependencies of the import of a single category.
+
+        :param records: categories read from PrestaShop
+        :return: ids of the categories imported, skipped, and the ones
+                 which failed, with the children of the failed ones
+        :rtype: tuple
+        """
+        ids = set(int(record['id']) for record in records)
+        parent_ids = set(int(record['id_parent']) for record in records)
+        parent_ids.discard(0)
+        bindings = self.binder.to_internal_many(ids | parent_ids)
+        self.parent_ids = dict((prestashop_id, binding.odoo_id.id)
+                               for prestashop_id, binding
+                               in bindings.iteritems())
+        to_create = sorted(ids - set(bindings))
+        for prestashop_id in to_create:
+            self._lock_import(prestashop_id)
+        if to_create:
+            self._check_many_in_new_connector_env(to_create)
+        imported = []
+        skipped = []
+        failed = []
+        for record in sort_parents_first(records):
+            prestashop_id = int(record['id'])
+            parent_id = int(record['id_parent'])
+            if parent_id and parent_id not in self.parent_ids:
+                # its parent failed or is not imported yet, imported as
+                # a dependency of the category in its own job
+                failed.append(prestashop_id)
+                continue
+            binding = bindings.get(prestashop_id)
+            self.prestashop_id = prestashop_id
+            self.prestashop_record = record
+            if self._is_uptodate(binding):
+                self.parent_ids[prestashop_id] = binding.odoo_id.id
+                skipped.append(prestashop_id)
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    self._import(binding, **kwargs)
+            except RetryableJobError:
+                raise
+            except Exception:
+                _logger.info('Import of the category %s failed, delaying '
+                             'it alone', prestashop_id, exc_info=True)
+                self.env.invalidate_all()
+                clear_job_caches(self.env)
+                failed.append(prestashop_id)
+                continue
+            if not binding:
+                binding = self.binder.to_internal(prestashop_id)
+            self.parent_ids[prestashop_id] = binding.odoo_id.id
+            imported.append(prestashop_id)
+        return imported, skipped, failed
+
     def _import_dependencies(self):
         record = self.prestashop_record
         if record['id_parent'] != '0':
@@ -111,6 +200,74 @@ class ProductCategoryImporter(TranslatableRecordImporter):
                 )
 
 
+def sort_parents_first(records):
+    """ Sort categories so each parent comes before its children
+
+    The categories whose parent is not in ``records`` (root categories or
+    parents already imported) come first.
+
+    :param records: categories read from PrestaShop
+    :rtype: list
+    """
+    children = {}
+    ids = set(record['id'] for record in records)
+    roots = []
+    for record in sorted(records, key=lambda record: int(record['id'])):
+        if record['id_parent'] in ids and record['id_parent'] != record['id']:
+            children.setdefault(record['id_parent'], []).append(record)
+        else:
+            roots.append(record)
+    result = []
+    stack = list(reversed(roots))
+    while stack:
+        record = stack.pop()
+        result.append(record)
+        stack.extend(reversed(children.pop(record['id'], [])))
+    # categories in a loop of parents, PrestaShop should not allow it
+    for remaining in children.itervalues():
+        result.extend(remaining)
+    return result
+
+
 @prestashop
 class ProductCategoryBatchImporter(DelayedBatchImporter):
+    """ Import the category tree in the current job
+
+    The categories are read with their data by large pages and imported
+    parents first in one pass, see ``ProductCategoryImporter.import_tree``,
+    so the products can assume the tree is there.
+    """
     _model_name = 'prestashop.product.category'
+    # number of categories read per request
+    tree_page_size = 5000
+
+    def _read_tree(self, filters):
+        """ Read the categories matching the filters, page by page """
+        filters = dict(filters or {}, sort='[id_ASC]',
+                       limit=str(self.tree_page_size))
+        records = []
+        while True:
+            page = self.backend_adapter.search_read(filters)
+            records += page
+            if len(page) < self.tree_page_size:
+                break
+            filters['filter[id]'] = '>[%d]' % max(
+                int(record['id']) for record in page
+            )
+        return records
+
+    def run(self, filters=None, **kwargs):
+        """ Run the synchronization
+
+        The categories which fail are delayed in their own job.
+
+        :return: summary of the import
+        """
+        records = self._read_tree(filters)
+        importer = self.unit_for(PrestashopImporter)
+        imported, skipped, failed = importer.import_tree(records, **kwargs)
+        for prestashop_id in failed:
+            self._import_record(prestashop_id, **kwargs)
+        return _('%d categories imported, %d skipped, %d failed and '
+                 'delayed separately') % (len(imported), len(skipped),
+                                          len(failed))
@@ -45,8 +45,7 @@ class ProductImageAdapter(PrestaShopCRUDAdapter):
     _export_node_name_res = 'image'
 
     def read(self, product_tmpl_id, image_id, options=None):
-        api = PrestaShopWebServiceImage(self.prestashop.api_url,
-                                        self.prestashop.webservice_key)
+        api = self.get_client(client_class=PrestaShopWebServiceImage)
         return api.get_image(
             self._prestashop_image_model,
             product_tmpl_id,
@@ -55,8 +54,7 @@ class ProductImageAdapter(PrestaShopCRUDAdapter):
         )
 
     def create(self, attributes=None):
-        api = PrestaShopWebServiceImage(
-            self.prestashop.api_url, self.prestashop.webservice_key)
+        api = self.get_client(client_class=PrestaShopWebServiceImage)
         # TODO: odoo logic in the adapter? :-(
         url = '{}/{}'.format(self._prestashop_model, attributes['id_product'])
         return api.add(url, files=[(
@@ -66,8 +64,7 @@ class ProductImageAdapter(PrestaShopCRUDAdapter):
         )])
 
     def write(self, id, attributes=None):
-        api = PrestaShopWebServiceImage(
-            self.prestashop.api_url, self.prestashop.webservice_key)
+        api = self.get_client(client_class=PrestaShopWebServiceImage)
         # TODO: odoo logic in the adapter? :-(
         url = '{}/{}'.format(self._prestashop_model, attributes['id_product'])
         url_del = '{}/{}/{}/{}'.format(
@@ -84,6 +81,5 @@ class ProductImageAdapter(PrestaShopCRUDAdapter):
 
     def delete(self, resource, id):
         """ Delete a record on the external system """
-        api = PrestaShopWebServiceImage(
-            self.prestashop.api_url, self.prestashop.webservice_key)
+        api = self.get_client(client_class=PrestaShopWebServiceImage)
         return api.delete(resource, resource_ids=id)
@@ -8,6 +8,7 @@ from odoo.addons.queue_job.job import job
 from ...unit.backend_adapter import GenericAdapter
 from ...backend import prestashop
 from exporter import CombinationInventoryExporter
+from ..product_template.common import write_prestashop_qty
 
 
 class ProductProduct(models.Model):
@@ -164,9 +165,15 @@ class PrestashopProductCombination(models.Model):
 
     @api.multi
     def recompute_prestashop_qty(self):
-        for product_binding in self:
-            if product_binding.quantity != product_binding.qty_available:
-                product_binding.quantity = product_binding.qty_available
+        # qty_available is computed for all the products at once
+        product_qties = dict(
+            (product.id, product.qty_available)
+            for product in self.mapped('odoo_id')
+        )
+        write_prestashop_qty(self, dict(
+            (binding.id, product_qties[binding.odoo_id.id])
+            for binding in self
+        ))
         return True
 
     @api.model
@@ -184,9 +191,9 @@ class PrestashopProductCombination(models.Model):
     @api.model
     @job(default_channel='root.prestashop')
     def export_product_quantities(self, backend):
-        self.search([
-            ('backend_id', 'in', backend.ids),
-        ]).recompute_prestashop_qty()
+        # templates and combinations are exported together
+        return self.env['prestashop.product.template'] \
+            .export_product_quantities(backend)
 
 
 class ProductAttribute(models.Model):
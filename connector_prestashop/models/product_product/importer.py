@@ -16,6 +16,8 @@ from ...unit.importer import (
     DelayedBatchImporter,
 )
 from ...unit.backend_adapter import GenericAdapter, PrestaShopCRUDAdapter
+from ...unit.cache import job_cache
+from ...unit.mapper import unique_name
 from ...backend import prestashop
 
 import logging
@@ -31,33 +33,165 @@ class ProductCombinationImporter(PrestashopImporter):
     _model_name = 'prestashop.product.combination'
 
     def _import_dependencies(self):
-        record = self.prestashop_record
+        self._import_option_values([self.prestashop_record])
+
+    def _import_option_values(self, records):
+        """ Import the options and option values of combinations
+
+        The option values of all the combinations are read at once and
+        the missing ones imported in bulk, the ones which failed are
+        imported again one by one so the error is raised in this job.
+        """
         ps_key = self.backend_record.get_version_ps_key('product_option_value')
-        option_values = record.get('associations', {}).get(
-            'product_option_values', {}).get(ps_key, [])
-        if not isinstance(option_values, list):
-            option_values = [option_values]
-        backend_adapter = self.unit_for(
-            BackendAdapter, 'prestashop.product.combination.option.value')
-        for option_value in option_values:
-            option_value = backend_adapter.read(option_value['id'])
+        option_value_ids = set()
+        for record in records:
+            option_values = record.get('associations', {}).get(
+                'product_option_values', {}).get(ps_key, [])
+            if not isinstance(option_values, list):
+                option_values = [option_values]
+            option_value_ids.update(int(option_value['id'])
+                                    for option_value in option_values)
+        option_values = self._get_option_values(sorted(option_value_ids))
+        group_ids = sorted(set(value['id_attribute_group']
+                               for value in option_values.values()))
+        self._import_dependencies_many(
+            group_ids, 'prestashop.product.combination.option')
+        self._import_dependencies_many(
+            option_values.keys(),
+            'prestashop.product.combination.option.value',
+            prestashop_records=option_values)
+        for group_id in group_ids:
             self._import_dependency(
-                option_value['id_attribute_group'],
-                'prestashop.product.combination.option')
+                group_id, 'prestashop.product.combination.option')
+        for value_id in sorted(option_values):
             self._import_dependency(
-                option_value['id'],
-                'prestashop.product.combination.option.value')
+                value_id, 'prestashop.product.combination.option.value')
+
+    def _get_option_values(self, option_value_ids):
+        """ Return the option values of a combination
+
+        Only the option values which have not been read yet in the job are
+        read, at once, so the combinations of the templates imported in the
+        job share them.
+
+        :return: option values by (integer) id
+        :rtype: dict
+        """
+        cache = job_cache(self.env, 'option_values', transactional=False)
+        values = cache.get(self.backend_record.id)
+        if values is None:
+            values = {}
+            cache.set(self.backend_record.id, values)
+        missing = [value_id for value_id in option_value_ids
+                   if value_id not in values]
+        if missing:
+            backend_adapter = self.unit_for(
+                BackendAdapter, 'prestashop.product.combination.option.value')
+            values.update(backend_adapter.read_many(missing))
+        return dict((value_id, values[value_id])
+                    for value_id in option_value_ids if value_id in values)
+
+    def __init__(self, environment):
+        """
+        :param environment: current environment (backend, session, ...)
+        :type environment: :py:class:`connector.connector.ConnectorEnvironment`
+        """
+        super(ProductCombinationImporter, self).__init__(environment)
+        self.main_template_locked = False
+
+    def run(self, prestashop_id, prestashop_record=None,
+            main_template_locked=False, **kwargs):
+        """ Run the synchronization
+
+        :param main_template_locked: True when the combination is imported
+                                     by the import of its template, which
+                                     holds the lock on the template
+        """
+        self.main_template_locked = main_template_locked
+        if not main_template_locked:
+            # the combinations of the template may be written by the
+            # import of the template meanwhile
+            if not prestashop_record:
+                prestashop_record = self.backend_adapter.read(prestashop_id)
+            self._lock_template(prestashop_record['id_product'])
+        return super(ProductCombinationImporter, self).run(
+            prestashop_id, prestashop_record=prestashop_record, **kwargs
+        )
+
+    def _lock_template(self, prestashop_template_id):
+        """ Take the lock of the import of the template """
+        template_importer = self.unit_for(PrestashopImporter,
+                                          'prestashop.product.template')
+        template_importer._lock_import(prestashop_template_id)
+
+    def import_template_combinations(self, records):
+        """ Import the combinations of a template at once
+
+        Called by the import of the template, which holds the lock on the
+        template. The option values of all the combinations are imported
+        once, the existing bindings are searched with one query, then the
+        combinations are mapped and the existing ones updated, the other
+        ones created, in one pass. The lock and the dependencies of the
+        import of a single combination are not needed, and the bindings
+        created meanwhile by other transactions are checked once.
+
+        :param records: combinations read from PrestaShop, in the order
+                        of their import
+        :return: number of combinations created and updated
+        :rtype: dict
+        """
+        self.main_template_locked = True
+        self._import_option_values(records)
+        bindings = self.binder.to_internal_many(
+            int(record['id']) for record in records
+        )
+        to_create = [int(record['id']) for record in records
+                     if int(record['id']) not in bindings]
+        if to_create:
+            self._check_many_in_new_connector_env(to_create)
+        result = {'created': 0, 'updated': 0}
+        for record in records:
+            self.prestashop_id = int(record['id'])
+            self.prestashop_record = record
+            binding = bindings.get(self.prestashop_id)
+            if self._is_uptodate(binding):
+                continue
+            self._import(binding)
+            result['updated' if binding else 'created'] += 1
+        return result
 
     def _after_import(self, binding):
         super(ProductCombinationImporter, self)._after_import(binding)
-        self.import_supplierinfo(binding)
+        if not self.main_template_locked:
+            # done for all the combinations by the template otherwise
+            self.import_supplierinfo(binding)
+
+    def import_template_details(self, template_binding, combinations=None):
+        """ Import the supplier info and set the images of all the
+        combinations of a template
+
+        :param combinations: combinations with their images associations,
+                             as read by the import of the template, they
+                             are read when not given
+        """
+        ps_id = template_binding.prestashop_id
+        self.sync_supplierinfo(ps_id)
+        if combinations is None:
+            combinations = self.backend_adapter.search_read(
+                {'filter[id_product]': ps_id}
+            )
+        self.set_variant_images(combinations)
 
     def set_variant_images(self, combinations):
         backend_adapter = self.unit_for(
             PrestaShopCRUDAdapter, 'prestashop.product.combination')
         for combination in combinations:
             try:
-                record = backend_adapter.read(combination['id'])
+                if 'associations' in combination:
+                    # already read
+                    record = combination
+                else:
+                    record = backend_adapter.read(combination['id'])
                 associations = record.get('associations', {})
                 ps_images = associations.get('images', {}).get(
                     self.backend_record.get_version_ps_key('image'), {})
@@ -83,24 +217,22 @@ class ProductCombinationImporter(PrestashopImporter):
                 # TODO: don't we track anything here? Maybe a checkpoint?
                 pass
 
+    def sync_supplierinfo(self, prestashop_product_id):
+        supplierinfo_importer = self.unit_for(
+            DelayedBatchImporter, 'prestashop.product.supplierinfo'
+        )
+        return supplierinfo_importer.sync_product(prestashop_product_id)
+
     def import_supplierinfo(self, binding):
-        ps_id = self._get_prestashop_data()['id']
-        filters = {
-            # 'filter[id_product]': ps_id,
-            'filter[id_product_attribute]': ps_id
-        }
-        self.env['prestashop.product.supplierinfo'].import_batch(
-            backend=self.backend_record,
-            filters=filters
+        """ Import the supplier info of the combination imported alone,
+        the ones of the whole product are synchronized by the import of
+        the template """
+        supplierinfo_importer = self.unit_for(
+            DelayedBatchImporter, 'prestashop.product.supplierinfo'
+        )
+        return supplierinfo_importer.sync_combination(
+            self.prestashop_record['id']
         )
-        ps_product_template = binding
-        ps_supplierinfos = self.env['prestashop.product.supplierinfo']. \
-            search([('product_tmpl_id', '=', ps_product_template.id)])
-        for ps_supplierinfo in ps_supplierinfos:
-            try:
-                ps_supplierinfo.resync()
-            except PrestaShopWebServiceError:
-                ps_supplierinfo.odoo_id.unlink()
 
     # OLD CODE
     # def import_supplierinfo(self, binding):
@@ -203,16 +335,6 @@ class ProductCombinationMapper(ImportMapper):
         template_binding = self.get_main_template_binding(record)
         return {'main_template_id': template_binding.id}
 
-    def _template_code_exists(self, code):
-        model = self.env['product.product']
-        combination_binder = self.binder_for('prestashop.product.combination')
-        template_ids = model.search([
-            ('default_code', '=', code),
-            ('company_id', '=', self.backend_record.company_id.id),
-        ], limit=1)
-        return template_ids and not combination_binder.to_external(
-            template_ids, wrap=True)
-
     # OLD CODE
     # def _template_code_exists(self, code):
     #     model = self.session.env['product.product']
@@ -229,14 +351,25 @@ class ProductCombinationMapper(ImportMapper):
         code = record.get('reference')
         if not code:
             code = "%s_%s" % (record['id_product'], record['id'])
-        if not self._template_code_exists(code):
-            return {'default_code': code}
-        i = 1
-        current_code = '%s_%s' % (code, i)
-        while self._template_code_exists(current_code):
-            i += 1
-            current_code = '%s_%s' % (code, i)
-        return {'default_code': current_code}
+        backend_id = self.backend_record.id
+
+        def bound_products(products):
+            # the codes of the products already bound to a combination
+            # can be reused
+            combination_model = products.env[
+                'prestashop.product.combination'
+            ].with_context(active_test=False)
+            return combination_model.search([
+                ('backend_id', '=', backend_id),
+                ('odoo_id', 'in', products.ids),
+            ]).mapped('odoo_id')
+
+        code = unique_name(
+            self, 'product.product', 'default_code', code,
+            domain=[('company_id', '=', self.backend_record.company_id.id)],
+            reusable=bound_products,
+        )
+        return {'default_code': code}
 
     @mapping
     def backend_id(self, record):
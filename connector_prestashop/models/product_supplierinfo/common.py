@@ -65,8 +65,7 @@ class SupplierImageAdapter(PrestaShopCRUDAdapter):
     _prestashop_image_model = 'suppliers'
 
     def read(self, supplier_id, options=None):
-        client = PrestaShopWebServiceImage(self.prestashop.api_url,
-                                           self.prestashop.webservice_key)
+        client = self.get_client(client_class=PrestaShopWebServiceImage)
         res = client.get_image(
             self._prestashop_image_model,
             supplier_id,
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
-from odoo import fields
-from odoo.addons.queue_job.exception import FailedJobError
+from odoo import fields, models
+from odoo.addons.queue_job.exception import (
+    FailedJobError,
+    NothingToDoJob,
+    RetryableJobError,
+)
 from odoo.addons.queue_job.job import job
 from odoo.addons.connector.unit.mapper import ImportMapper, mapping
 
 from ...unit.backend_adapter import PrestaShopCRUDAdapter
+from ...unit.binder import invalidate_bindings
+from ...unit.cache import clear_job_caches
 from ...unit.importer import (
     PrestashopImporter,
     import_batch,
@@ -170,6 +176,119 @@ class SupplierInfoImporter(PrestashopImporter):
 class SupplierInfoBatchImporter(DelayedBatchImporter):
     _model_name = 'prestashop.product.supplierinfo'
 
+    def _is_changed(self, binding, record):
+        """ Return True when the binding differs from the PrestaShop record
+        """
+        values = self.mapper.map_record(record).values()
+        for field_name, value in values.iteritems():
+            current = binding[field_name]
+            if isinstance(current, models.BaseModel):
+                current = current.id
+            # empty values are read as False
+            if (current or False) != (value or False):
+                return True
+        return False
+
+    def sync_product(self, prestashop_product_id):
+        """ Synchronize the supplier info of a product and its combinations
+
+        All the supplier info of the product are read with one request
+        and compared with the bindings: only the new and modified ones are
+        imported, and the ones deleted on PrestaShop are deleted. Each
+        record is imported in a savepoint, the ones which fail are delayed
+        in their own job.
+
+        Nothing is deleted when PrestaShop returns no supplier info for
+        the product, as an empty response cannot be told apart from a
+        truncated one. An error of the request fails the synchronization
+        before anything is deleted.
+
+        :param prestashop_product_id: id of the product on PrestaShop
+        :return: number of records created, updated, deleted and failed
+        :rtype: dict
+        """
+        records = self._read_records({
+            'filter[id_product]': prestashop_product_id,
+        })
+        # the bindings of the template and the ones of the records, in case
+        # they have been moved to another product on PrestaShop
+        existing = self.binder_for().to_internal_many(records)
+        template = self.binder_for('prestashop.product.template').to_internal(
+            prestashop_product_id, unwrap=True,
+        )
+        if template:
+            for binding in self.model.search([
+                    ('backend_id', '=', self.backend_record.id),
+                    ('product_tmpl_id', '=', template.id)]):
+                existing[binding.prestashop_id] = binding
+        result = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+        if records:
+            to_delete = [binding for prestashop_id, binding
+                         in existing.items()
+                         if prestashop_id not in records]
+        else:
+            _logger.info('No supplier info returned for product %s, the '
+                         'existing ones are kept', prestashop_product_id)
+            to_delete = []
+        for binding in to_delete:
+            # the binding is deleted in cascade, not by its unlink()
+            invalidate_bindings(binding)
+            binding.odoo_id.unlink()
+            result['deleted'] += 1
+        self._import_changed(records, existing, result)
+        return result
+
+    def sync_combination(self, prestashop_combination_id):
+        """ Import the new and modified supplier info of a combination
+
+        Used when a combination is imported alone: the supplier info of
+        the other combinations of the product are left untouched, and
+        nothing is deleted, see :meth:`sync_product`.
+
+        :param prestashop_combination_id: id of the combination on
+                                          PrestaShop
+        :return: number of records created, updated, deleted and failed
+        :rtype: dict
+        """
+        records = self._read_records({
+            'filter[id_product_attribute]': prestashop_combination_id,
+        })
+        existing = self.binder_for().to_internal_many(records)
+        result = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+        self._import_changed(records, existing, result)
+        return result
+
+    def _read_records(self, filters):
+        return dict(
+            (int(record['id']), record)
+            for record in self.backend_adapter.search_read(filters)
+        )
+
+    def _import_changed(self, records, existing, result):
+        """ Import the records without binding or whose binding differs,
+        counting them in ``result`` """
+        for prestashop_id, record in sorted(records.iteritems()):
+            binding = existing.get(prestashop_id)
+            if binding and not self._is_changed(binding, record):
+                continue
+            importer = self.unit_for(PrestashopImporter)
+            try:
+                with self.env.cr.savepoint():
+                    importer.run(prestashop_id, prestashop_record=record)
+            except RetryableJobError:
+                raise
+            except NothingToDoJob:
+                continue
+            except Exception:
+                _logger.info('Import of %s %s failed, delaying it alone',
+                             self.model._name, prestashop_id, exc_info=True)
+                self.env.invalidate_all()
+                clear_job_caches(self.env)
+                self._import_record(prestashop_id)
+                result['failed'] += 1
+                continue
+            result['updated' if binding else 'created'] += 1
+
 
 @job(default_channel='root.prestashop')
 def import_suppliers(session, backend_id, since_date, **kwargs):
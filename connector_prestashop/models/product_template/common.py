@@ -1,22 +1,43 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
+from collections import defaultdict
+
 from odoo import api, fields, models
+from odoo.tools import float_compare, split_every
 from odoo.addons import decimal_precision as dp
 
 from odoo.addons.queue_job.job import job
 from ...unit.backend_adapter import GenericAdapter
+from ...unit.importer import PrestashopImporter
 from ...backend import prestashop
-from exporter import ProductInventoryExporter
+from exporter import ProductInventoryExporter, ProductInventoryBulkExporter
 
 import logging
+import threading
+import time
 
 _logger = logging.getLogger(__name__)
 
-try:
-    from prestapyt import PrestaShopWebServiceDict
-except:
-    _logger.debug('Cannot import from `prestapyt`')
+
+def write_prestashop_qty(bindings, quantities):
+    """ Write the quantities of the product bindings which changed
+
+    The bindings having the same new quantity are written together.
+
+    :param bindings: recordset of template or combination bindings
+    :param quantities: new quantities by binding id
+    """
+    precision = bindings.env['decimal.precision'].precision_get(
+        'Product Unit of Measure')
+    to_write = defaultdict(list)
+    for binding in bindings:
+        new_qty = quantities.get(binding.id, 0.)
+        if float_compare(binding.quantity, new_qty,
+                         precision_digits=precision):
+            to_write[new_qty].append(binding.id)
+    for new_qty, binding_ids in to_write.iteritems():
+        bindings.browse(binding_ids).write({'quantity': new_qty})
 
 
 class ProductTemplate(models.Model):
@@ -113,19 +134,37 @@ class PrestashopProductTemplate(models.Model):
 
     @api.multi
     def recompute_prestashop_qty(self):
-        for product_binding in self:
-            new_qty = product_binding._prestashop_qty()
-            if product_binding.quantity != new_qty:
-                product_binding.quantity = new_qty
-            product_binding.export_inventory(product_binding.backend_id)
+        for backend in self.mapped('backend_id'):
+            bindings = self.filtered(lambda x: x.backend_id == backend)
+            locations = self._prestashop_locations(backend)
+            templates = bindings.mapped('odoo_id').with_context(
+                location=locations.ids
+            )
+            # qty_available is computed for all the templates at once
+            template_qties = dict(
+                (template.id, template.qty_available)
+                for template in templates
+            )
+            write_prestashop_qty(bindings, dict(
+                (binding.id, template_qties[binding.odoo_id.id])
+                for binding in bindings
+            ))
+        if not self.env.context.get('connector_no_export'):
+            for product_binding in self:
+                product_binding.export_inventory(product_binding.backend_id)
         return True
 
-    def _prestashop_qty(self):
-        locations = self.env['stock.location'].search([
-            ('id', 'child_of', self.backend_id.warehouse_id.lot_stock_id.id),
+    @api.model
+    def _prestashop_locations(self, backend):
+        """ Locations whose stock is exported to ``backend`` """
+        return self.env['stock.location'].search([
+            ('id', 'child_of', backend.warehouse_id.lot_stock_id.id),
             ('prestashop_synchronized', '=', True),
             ('usage', '=', 'internal'),
         ])
+
+    def _prestashop_qty(self):
+        locations = self._prestashop_locations(self.backend_id)
         return self.with_context(location=locations.ids).qty_available
 
     @job(default_channel='root.prestashop')
@@ -134,14 +173,44 @@ class PrestashopProductTemplate(models.Model):
         if since_date:
             filters = {'date': '1', 'filter[date_upd]': '>[%s]' % (since_date)}
         now_fmt = fields.Datetime.now()
-        print self.env['prestashop.product.category']
-        self.env['prestashop.product.category'].with_delay(
+        self.with_delay(
             priority=15
-        ).import_batch(backend=backend, filters=filters, **kwargs)
+        ).import_categories_and_products(backend, filters, **kwargs)
+        backend.import_products_since = now_fmt
+        return True
+
+    @job(default_channel='root.prestashop')
+    def import_categories_and_products(self, backend, filters=None,
+                                       **kwargs):
+        """ Import the category tree, then delay the import of the products
+
+        The products depend on the tree, they only have to import the
+        categories created meanwhile.
+        """
+        result = self.env['prestashop.product.category'].import_batch(
+            backend=backend, filters=filters, **kwargs
+        )
         self.env['prestashop.product.template'].with_delay(
             priority=15
         ).import_batch(backend, filters, **kwargs)
-        backend.import_products_since = now_fmt
+        return result
+
+    @api.multi
+    @job(default_channel='root.prestashop')
+    def import_combinations_details(self, combinations=None):
+        """ Import the supplier info and the images of the combinations
+        of the templates
+
+        :param combinations: combinations with their images associations,
+                             read by the import of the template
+        """
+        for binding in self:
+            env = binding.backend_id.get_environment(
+                'prestashop.product.combination'
+            )
+            importer = env.get_connector_unit(PrestashopImporter)
+            importer.import_template_details(binding,
+                                             combinations=combinations)
         return True
 
     @job(default_channel='root.prestashop')
@@ -154,9 +223,18 @@ class PrestashopProductTemplate(models.Model):
     @api.model
     @job(default_channel='root.prestashop')
     def export_product_quantities(self, backend):
-        self.search([
-            ('backend_id', 'in', backend.ids),
-        ]).recompute_prestashop_qty()
+        """ Recompute the quantities of the templates and combinations
+        of the backend and export the ones which changed at once """
+        domain = [('backend_id', 'in', backend.ids)]
+        self.with_context(connector_no_export=True).search(
+            domain
+        ).recompute_prestashop_qty()
+        self.env['prestashop.product.combination'].with_context(
+            connector_no_export=True
+        ).search(domain).recompute_prestashop_qty()
+        env = backend.get_environment(self._name)
+        exporter = env.get_connector_unit(ProductInventoryBulkExporter)
+        return exporter.run()
 
 @prestashop
 class ProductInventoryAdapter(GenericAdapter):
@@ -167,22 +245,101 @@ class ProductInventoryAdapter(GenericAdapter):
     def get(self, options=None):
         return self.client.get(self._prestashop_model, options=options)
 
-    def export_quantity(self, filters, quantity):
-        self.export_quantity_url(
-            filters,
-            quantity,
-        )
+    _stock_page_size = 5000
 
+    def _shop_clients(self):
+        """ Clients of the shops having their own URL """
         shops = self.env['prestashop.shop'].search([
             ('backend_id', '=', self.backend_record.id),
             ('default_url', '!=', False),
         ])
-        for shop in shops:
-            url = '%s/api' % shop.default_url
-            key = self.backend_record.webservice_key
-            client = PrestaShopWebServiceDict(url, key)
+        return [self.get_client(api_url='%s/api' % shop.default_url)
+                for shop in shops]
+
+    def export_quantity(self, filters, quantity):
+        self.export_quantity_url(
+            filters,
+            quantity,
+        )
+        for client in self._shop_clients():
             self.export_quantity_url(filters, quantity, client=client)
 
+    def _iter_stock_pages(self, client, product_ids=None):
+        """ Yield the stock records by pages, sorted by id
+
+        The records are read with all their fields, as they are written
+        back as a whole (e.g. ``location`` on PrestaShop 1.7 is cleared
+        when it is missing).
+
+        :param product_ids: ids of the products on PrestaShop whose stock
+                            records are read, all of them when None
+        """
+        if product_ids is None:
+            product_filters = [{}]
+        else:
+            product_filters = [
+                {'filter[id_product]': '[%s]' % '|'.join(
+                    str(product_id) for product_id in chunk
+                )}
+                for chunk in split_every(self._read_many_chunk_size,
+                                         sorted(product_ids), list)
+            ]
+        for product_filter in product_filters:
+            last_id = 0
+            while True:
+                options = dict(
+                    product_filter,
+                    display='full',
+                    sort='[id_ASC]',
+                    limit=str(self._stock_page_size),
+                )
+                if last_id:
+                    options['filter[id]'] = '>[%d]' % last_id
+                page = list(self.iter_search_read(options, client=client))
+                if page:
+                    last_id = int(page[-1]['id'])
+                    yield page
+                if len(page) < self._stock_page_size:
+                    break
+
+    def export_quantities(self, quantities, product_ids=None):
+        """ Export the quantities which differ from the ones in PrestaShop
+
+        The stock records are read by pages and only the records with
+        a different quantity are written.
+
+        :param quantities: quantities to export, with
+                           ``(id_product, id_product_attribute)`` (integers)
+                           as keys
+        :param product_ids: ids of the products on PrestaShop whose stock
+                            records are read, all of them when None
+        :return: number of stock records ``pushed`` and ``skipped``
+                 (already up-to-date)
+        :rtype: dict
+        """
+        report = {'pushed': 0, 'skipped': 0}
+        for client in [self.client] + self._shop_clients():
+            for page in self._iter_stock_pages(client,
+                                               product_ids=product_ids):
+                to_push = []
+                for stock in page:
+                    key = (int(stock['id_product']),
+                           int(stock['id_product_attribute']))
+                    if key not in quantities:
+                        continue
+                    quantity = int(quantities[key])
+                    if int(stock['quantity']) == quantity:
+                        report['skipped'] += 1
+                        continue
+                    stock['quantity'] = quantity
+                    to_push.append(stock)
+                for stock in to_push:
+                    client.edit(self._prestashop_model, {
+                        self._export_node_name: stock
+                    })
+                report['pushed'] += len(to_push)
+        return report
+
     def export_quantity_url(self, filters, quantity, client=None):
         if client is None:
             client = self.client
@@ -197,11 +354,60 @@ class ProductInventoryAdapter(GenericAdapter):
             })
 
 
+# names of the tags by database and backend, shared by the jobs of the
+# worker process, see ``PrestashopProductTags.get_names``
+_tag_names = {}
+_tag_names_lock = threading.Lock()
+
+
 @prestashop
 class PrestashopProductTags(GenericAdapter):
     _model_name = '_prestashop_product_tag'
     _prestashop_model = 'tags'
     _export_node_name = 'tag'
+    # seconds after which all the tags are read again
+    _tag_cache_ttl = 3600
+
+    def get_names(self, tag_ids):
+        """ Return the names of tags
+
+        All the tags of the backend are read at once and kept for
+        ``_tag_cache_ttl`` seconds, the tags created meanwhile are read
+        when they are asked for.
+
+        :param tag_ids: PrestaShop ids of the tags
+        :return: the names, in the same order, of the tags which exist
+        :rtype: list
+        """
+        tag_ids = [int(tag_id) for tag_id in tag_ids]
+        key = (self.env.cr.dbname, self.backend_record.id)
+        now = time.time()
+        with _tag_names_lock:
+            cache = _tag_names.get(key)
+        if cache is None or cache['loaded_at'] + self._tag_cache_ttl < now:
+            names = dict(
+                (int(tag['id']), tag['name'])
+                for tag in self.search({'display': '[id,name]'})
+            )
+            cache = {'loaded_at': now, 'names': names}
+            with _tag_names_lock:
+                _tag_names[key] = cache
+        missing = [tag_id for tag_id in tag_ids
+                   if tag_id not in cache['names']]
+        if missing:
+            tags = self.search({
+                'filter[id]': '[%s]' % '|'.join(str(x) for x in missing),
+                'display': '[id,name]',
+            })
+            with _tag_names_lock:
+                # the tags not found are remembered as well
+                cache['names'].update(dict.fromkeys(missing))
+                cache['names'].update(
+                    (int(tag['id']), tag['name']) for tag in tags
+                )
+        names = cache['names']
+        return [names[tag_id] for tag_id in tag_ids
+                if names.get(tag_id) is not None]
 
     def search(self, filters=None):
         res = self.client.get(self._prestashop_model, options=filters)
@@ -2,6 +2,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
 
+from odoo import _
 from odoo.addons.queue_job.job import job
 from odoo.addons.connector.unit.synchronizer import Exporter
 
@@ -29,6 +30,77 @@ class ProductInventoryExporter(Exporter):
         adapter.export_quantity(filter, int(template.quantity))
 
 
+@prestashop
+class ProductInventoryBulkExporter(Exporter):
+    """ Export the quantities of the products of a backend
+
+    The stock records of PrestaShop are read at once and only the
+    quantities which changed are written.
+    """
+    _model_name = ['prestashop.product.template']
+
+    def _get_quantities(self, templates=None, combinations=None):
+        """ Quantities of the bindings, indexed like the stock records by
+        ``(id_product, id_product_attribute)``
+
+        :param templates: template bindings to export, all the ones of
+                          the backend when None
+        :param combinations: combination bindings to export, all the ones
+                             of the backend when None
+        """
+        domain = [('backend_id', '=', self.backend_record.id)]
+        template_model = self.env['prestashop.product.template']
+        combination_model = self.env['prestashop.product.combination']
+        template_domain = domain
+        if templates is not None:
+            template_domain = domain + [('id', 'in', templates.ids)]
+        combination_domain = domain
+        if combinations is not None:
+            combination_domain = domain + [('id', 'in', combinations.ids)]
+        quantities = {}
+        template_ps_ids = {}
+        for template in template_model.search_read(
+                template_domain, ['prestashop_id', 'quantity']):
+            template_ps_ids[template['id']] = template['prestashop_id']
+            quantities[(template['prestashop_id'], 0)] = template['quantity']
+        combinations = combination_model.search_read(
+            combination_domain,
+            ['prestashop_id', 'quantity', 'main_template_id'],
+        )
+        missing = set(combination['main_template_id'][0]
+                      for combination in combinations
+                      ) - set(template_ps_ids)
+        for template in template_model.browse(list(missing)).read(
+                ['prestashop_id']):
+            template_ps_ids[template['id']] = template['prestashop_id']
+        for combination in combinations:
+            template_id = combination['main_template_id'][0]
+            key = (template_ps_ids.get(template_id),
+                   combination['prestashop_id'])
+            quantities[key] = combination['quantity']
+        return quantities
+
+    def run(self, templates=None, combinations=None):
+        """ Export the quantities to PrestaShop
+
+        All the quantities of the backend are exported, or only the ones
+        of ``templates`` and ``combinations`` when given. In the latter
+        case, only the stock records of their products are read.
+        """
+        adapter = self.unit_for(GenericAdapter, '_import_stock_available')
+        quantities = self._get_quantities(templates=templates,
+                                          combinations=combinations)
+        product_ids = None
+        if templates is not None or combinations is not None:
+            if not quantities:
+                return _('No quantity to export')
+            product_ids = set(key[0] for key in quantities)
+        report = adapter.export_quantities(quantities,
+                                           product_ids=product_ids)
+        return _('%(pushed)d quantities exported, '
+                 '%(skipped)d already up-to-date') % report
+
+
 # TODO: Remove because it has been moved to prestashop product template and
 # prestashop product combination
 @job(default_channel='root.prestashop')
@@ -20,14 +20,15 @@ from ...unit.importer import (
 from odoo.addons.connector.unit.mapper import external_to_m2o
 from odoo.addons.connector.connector import ConnectorEnvironment
 from ...unit.backend_adapter import GenericAdapter
+from ...unit.cache import LRUCache
+from ...unit.mapper import unique_name
 from ...backend import prestashop
-from ..product_image.importer import (
-    import_product_image,
-    set_product_image_variant,
-)
+from ..product_image.importer import import_product_image
 
 import datetime
+import hashlib
 import logging
+import threading
 _logger = logging.getLogger(__name__)
 
 try:
@@ -46,6 +47,33 @@ except ImportError:
     _logger.debug('Cannot import from `prestapyt`')
 
 
+# HTML conversions of the descriptions, by hash of the HTML, shared by the
+# jobs of the worker process
+_html_cache = LRUCache(maxsize=1000)
+_html_cache_lock = threading.Lock()
+
+
+def cached_html(kind, content, convert):
+    """ Return ``convert(content)``, cached by hash of ``content``
+
+    :param kind: name of the conversion, part of the key of the cache
+    :param content: HTML to convert
+    :param convert: function converting the HTML
+    """
+    if isinstance(content, unicode):
+        digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    else:
+        digest = hashlib.sha1(content).hexdigest()
+    key = (kind, digest)
+    with _html_cache_lock:
+        result = _html_cache.get(key)
+    if result is None:
+        result = convert(content)
+        with _html_cache_lock:
+            _html_cache.set(key, result)
+    return result
+
+
 @prestashop
 class TemplateMapper(ImportMapper):
     _model_name = 'prestashop.product.template'
@@ -90,12 +118,9 @@ class TemplateMapper(ImportMapper):
         if not isinstance(tags, list):
             tags = [tags]
         if tags:
-            ps_tags = tag_adapter.search(filters={
-                'filter[id]': '[%s]' % '|'.join(x['id'] for x in tags),
-                'display': '[name]'
-            })
-            if ps_tags:
-                return {'tags': ','.join(x['name'] for x in ps_tags)}
+            names = tag_adapter.get_names(x['id'] for x in tags)
+            if names:
+                return {'tags': ','.join(names)}
 
     @mapping
     def name(self, record):
@@ -130,14 +155,6 @@ class TemplateMapper(ImportMapper):
         if product:
             return {'odoo_id': product.id}
 
-    def _template_code_exists(self, code):
-        model = self.env['product.template']
-        template_ids = model.search([
-            ('default_code', '=', code),
-            ('company_id', '=', self.backend_record.company_id.id),
-        ], limit=1)
-        return len(template_ids) > 0
-
     # def _template_code_exists(self, code):
     #     model = self.session.env['product.template']
     #     template_ids = model.search([
@@ -155,16 +172,17 @@ class TemplateMapper(ImportMapper):
             code = "backend_%d_product_%s" % (
                 self.backend_record.id, record['id']
             )
-        if not self._template_code_exists(code):
-            return {'default_code': code}
-        i = 1
-        current_code = '%s_%d' % (code, i)
-        while self._template_code_exists(current_code):
-            i += 1
-            current_code = '%s_%d' % (code, i)
-        return {'default_code': current_code}
+        code = unique_name(
+            self, 'product.template', 'default_code', code,
+            domain=[('company_id', '=', self.backend_record.company_id.id)],
+        )
+        return {'default_code': code}
 
     def clear_html_field(self, content):
+        return cached_html('text', content, self._html_to_text)
+
+    @staticmethod
+    def _html_to_text(content):
         html = html2text.HTML2Text()
         html.ignore_images = True
         html.ignore_links = True
@@ -172,6 +190,11 @@ class TemplateMapper(ImportMapper):
 
     @staticmethod
     def sanitize_html(content):
+        return cached_html('sanitized', content,
+                           TemplateMapper._remove_xml_lang)
+
+    @staticmethod
+    def _remove_xml_lang(content):
         content = BeautifulSoup(content, 'html.parser')
         # Prestashop adds both 'lang="fr-ch"' and 'xml:lang="fr-ch"'
         # but Odoo tries to parse the xml for the translation and fails
@@ -324,6 +347,13 @@ class TemplateAdapter(GenericAdapter):
     _model_name = 'prestashop.product.template'
     _prestashop_model = 'products'
     _export_node_name = 'product'
+    _json_value_fields = (
+        'id_default_combination',
+        'manufacturer_name',
+        'position_in_category',
+        'quantity',
+        'type',
+    )
 
 
 class ImportInventory(models.TransientModel):
@@ -343,10 +373,12 @@ class ProductInventoryBatchImporter(DelayedBatchImporter):
         return _super.run(filters, **kwargs)
 
     def _run_page(self, filters, **kwargs):
-        records = self.backend_adapter.get(filters)
-        for record in records['stock_availables']['stock_available']:
+        record_ids = []
+        # the stock records are parsed one by one while they are received
+        for record in self.backend_adapter.iter_search_read(filters):
             self._import_record(record['id'], record=record, **kwargs)
-        return records['stock_availables']['stock_available']
+            record_ids.append(record['id'])
+        return record_ids
 
     def _import_record(self, record_id, record=None, **kwargs):
         """ Delay the import of the records"""
@@ -468,7 +500,7 @@ class ProductTemplateImporter(TranslatableRecordImporter):
 
     def _after_import(self, binding):
         super(ProductTemplateImporter, self)._after_import(binding)
-        self.import_combinations()
+        self.import_combinations(binding)
         self.attribute_line(binding)
         self.deactivate_default_product(binding)
         self.checkpoint_default_category_missing(binding)
@@ -514,28 +546,15 @@ class ProductTemplateImporter(TranslatableRecordImporter):
                         'value_ids': [(6, 0, values.ids)],
                     })
 
-    def _import_combination(self, combination, **kwargs):
-        """ Import a combination
+    def import_combinations(self, binding):
+        """ Import the combinations of the template
 
-        Can be overriden for instance to forward arguments to the importer
+        The combinations are read at once, then imported in one pass in
+        the transaction of the template, whose lock protects them. Their
+        supplier info and images are imported in one job per template,
+        see ``prestashop.product.template.import_combinations_details``.
         """
-        self._import_dependency(combination['id'],
-                                'prestashop.product.combination',
-                                always=True,
-                                **kwargs)
-
-    def _delay_product_image_variant(self, combinations, **kwargs):
-        set_product_image_variant.delay(
-            self.session,
-            'prestashop.product.combination',
-            self.backend_record.id,
-            combinations,
-            priority=15,
-            **kwargs
-        )
-
-    def import_combinations(self):
-        prestashop_record = self._get_prestashop_data()
+        prestashop_record = self.prestashop_record
         associations = prestashop_record.get('associations', {})
 
         ps_key = self.backend_record.get_version_ps_key('combinations')
@@ -543,26 +562,40 @@ class ProductTemplateImporter(TranslatableRecordImporter):
 
         if not isinstance(combinations, list):
             combinations = [combinations]
-        if combinations:
-            first_exec = combinations.pop(
-                combinations.index({
-                    'id': prestashop_record[
-                        'id_default_combination']['value']}))
-            if first_exec:
-                self._import_combination(first_exec)
-
-            for combination in combinations:
-                self._import_combination(combination)
-
-            if combinations and associations['images'].get('image'):
-                self._delay_product_image_variant(combinations)
-
+        if not combinations:
+            return
+        # import the default combination first
+        default_id = prestashop_record['id_default_combination']['value']
+        combinations.sort(key=lambda x: x['id'] != default_id)
+
+        adapter = self.unit_for(GenericAdapter,
+                                'prestashop.product.combination')
+        read = adapter.read_many([combination['id']
+                                  for combination in combinations])
+        # the combinations deleted meanwhile are missing
+        records = [read[int(combination['id'])]
+                   for combination in combinations
+                   if int(combination['id']) in read]
+        importer = self.unit_for(PrestashopImporter,
+                                 'prestashop.product.combination')
+        importer.import_template_combinations(records)
+        # only the images of the combinations are needed by the job
+        images = [
+            {'id': record['id'],
+             'associations': {
+                 'images': record.get('associations', {}).get('images', {}),
+             }}
+            for record in records
+        ]
+        binding.with_delay(priority=15).import_combinations_details(
+            combinations=images,
+        )
 
     def _delay_import_product_image(self, prestashop_record, image, **kwargs):
         self.env['prestashop.product.image'].with_delay(priority=10).import_batch(backend=self.backend_record, image=image)
 
     def import_images(self, binding):
-        prestashop_record = self._get_prestashop_data()
+        prestashop_record = self.prestashop_record
         associations = prestashop_record.get('associations', {})
         images = associations.get('images', {}).get(
             self.backend_record.get_version_ps_key('image'), {})
@@ -573,25 +606,10 @@ class ProductTemplateImporter(TranslatableRecordImporter):
                 self._delay_import_product_image(prestashop_record, image)
 
     def import_supplierinfo(self, binding):
-        ps_id = self._get_prestashop_data()['id']
-        filters = {
-            'filter[id_product]': ps_id,
-            'filter[id_product_attribute]': 0
-        }
-        import_batch(
-            self.session,
-            'prestashop.product.supplierinfo',
-            self.backend_record.id,
-            filters=filters
+        supplierinfo_importer = self.unit_for(
+            DelayedBatchImporter, 'prestashop.product.supplierinfo'
         )
-        ps_product_template = binding
-        ps_supplierinfos = self.env['prestashop.product.supplierinfo'].\
-            search([('product_tmpl_id', '=', ps_product_template.id)])
-        for ps_supplierinfo in ps_supplierinfos:
-            try:
-                ps_supplierinfo.resync()
-            except PrestaShopWebServiceError:
-                ps_supplierinfo.odoo_id.unlink()
+        supplierinfo_importer.sync_product(self.prestashop_record['id'])
 
     def _import_dependencies(self):
         self._import_default_category()
@@ -627,8 +645,13 @@ class ProductTemplateImporter(TranslatableRecordImporter):
             self.backend_record.get_version_ps_key('category'), [])
         if not isinstance(categories, list):
             categories = [categories]
-        for category in categories:
-            self._import_dependency(category['id'],
+        category_ids = [category['id'] for category in categories]
+        # the category tree is imported before the products, so they are
+        # usually all bound
+        self._import_dependencies_many(category_ids,
+                                       'prestashop.product.category')
+        for category_id in category_ids:
+            self._import_dependency(category_id,
                                     'prestashop.product.category')
 
 
@@ -672,3 +695,5 @@ def import_products(
 @prestashop
 class ProductTemplateBatchImporter(DelayedBatchImporter):
     _model_name = 'prestashop.product.template'
+    keyset_pagination = True
+    chunk_size = 10
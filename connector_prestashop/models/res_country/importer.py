@@ -12,6 +12,11 @@ class CountryImporter(AutoMatchingImporter):
     _erp_field = 'code'
     _ps_field = 'iso_code'
 
+    def _index_key(self, value):
+        if value and len(value) >= 2:
+            return value[0:2].lower()
+        return False
+
     def _compare_function(self, ps_val, erp_val, ps_dict, erp_dict):
         if (
             erp_val and
@@ -12,6 +12,11 @@ class ResCurrencyImporter(AutoMatchingImporter):
     _erp_field = 'name'
     _ps_field = 'iso_code'
 
+    def _index_key(self, value):
+        if value and len(value) == 3:
+            return value.lower()
+        return False
+
     def _compare_function(self, ps_val, erp_val, ps_dict, erp_dict):
         if len(erp_val) == 3 and len(ps_val) == 3 and \
                 erp_val[0:3].lower() == ps_val[0:3].lower():
@@ -2,7 +2,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
 
-from odoo import models, fields
+from odoo import api, models, fields, tools
 
 from ...unit.backend_adapter import GenericAdapter
 from ...backend import prestashop
@@ -25,6 +25,38 @@ class PrestashopResLang(models.Model):
         default=False,
     )
 
+    @api.model
+    @tools.ormcache('backend_id')
+    def _get_language_codes(self, backend_id):
+        """ Return the codes of the Odoo languages by PrestaShop id
+
+        The result is kept in the registry cache, which is cleared in all
+        the workers when a language binding is modified.
+
+        :param backend_id: id of the backend
+        :rtype: dict
+        """
+        bindings = self.with_context(active_test=False).search([
+            ('backend_id', '=', backend_id),
+        ])
+        return dict((str(binding.prestashop_id), binding.odoo_id.code)
+                    for binding in bindings)
+
+    @api.model
+    def create(self, vals):
+        self.clear_caches()
+        return super(PrestashopResLang, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        self.clear_caches()
+        return super(PrestashopResLang, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.clear_caches()
+        return super(PrestashopResLang, self).unlink()
+
 
 class ResLang(models.Model):
     _inherit = 'res.lang'
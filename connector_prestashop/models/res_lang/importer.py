@@ -15,6 +15,11 @@ class LangImporter(AutoMatchingImporter):
         ('active', 'active'),
     ]
 
+    def _index_key(self, value):
+        if value and len(value) >= 2:
+            return value[0:2].lower()
+        return False
+
     def _compare_function(self, ps_val, erp_val, ps_dict, erp_dict):
         if len(erp_val) >= 2 and len(ps_val) >= 2 and \
                 erp_val[0:2].lower() == ps_val[0:2].lower():
@@ -118,8 +118,31 @@ class ResPartnerImporter(PrestashopImporter):
             self._import_dependency(group['id'],
                                     'prestashop.res.partner.category')
 
+    def __init__(self, environment):
+        """
+        :param environment: current environment (backend, session, ...)
+        :type environment: :py:class:`connector.connector.ConnectorEnvironment`
+        """
+        super(ResPartnerImporter, self).__init__(environment)
+        self.import_addresses = True
+
+    def run(self, prestashop_id, prestashop_record=None,
+            import_addresses=True, **kwargs):
+        """ Run the synchronization
+
+        :param import_addresses: False when the addresses are imported by
+                                 the batch import of the customer, along
+                                 with the addresses of other customers
+        """
+        self.import_addresses = import_addresses
+        return super(ResPartnerImporter, self).run(
+            prestashop_id, prestashop_record=prestashop_record, **kwargs
+        )
+
     def _after_import(self, binding):
         super(ResPartnerImporter, self)._after_import(binding)
+        if not self.import_addresses:
+            return
         binder = self.binder_for()
         ps_id = binder.to_external(binding)
         self.env['prestashop.address'].with_delay(priority=10).import_batch(
@@ -130,6 +153,33 @@ class ResPartnerImporter(PrestashopImporter):
 @prestashop
 class PartnerBatchImporter(DelayedBatchImporter):
     _model_name = 'prestashop.res.partner'
+    keyset_pagination = True
+    chunk_size = 50
+
+    def _import_record(self, record, import_addresses=True, **kwargs):
+        # the customers failing or postponed in a chunk import their
+        # addresses alone
+        super(PartnerBatchImporter, self)._import_record(record, **kwargs)
+
+    def import_chunk(self, record_ids, **kwargs):
+        """ Import a chunk of customers, then all their addresses at once
+
+        :return: summary of the import
+        """
+        result = super(PartnerBatchImporter, self).import_chunk(
+            record_ids, import_addresses=False, **kwargs
+        )
+        customer_ids = self.binder_for().to_internal_many(record_ids)
+        if customer_ids:
+            address_importer = self.unit_for(DelayedBatchImporter,
+                                             'prestashop.address')
+            result = _('%s\nAddresses: %s') % (
+                result,
+                address_importer.import_customers_addresses(
+                    sorted(customer_ids)
+                ),
+            )
+        return result
 
 
 @prestashop
@@ -228,6 +278,28 @@ class AddressImporter(PrestashopImporter):
 @prestashop
 class AddressBatchImporter(DelayedBatchImporter):
     _model_name = 'prestashop.address'
+    keyset_pagination = True
+    chunk_size = 50
+
+    def import_customers_addresses(self, customer_ids):
+        """ Import the addresses of customers in the current job
+
+        The addresses of all the customers are read with one request, then
+        imported like a chunk: the ones which fail are delayed in their
+        own job.
+
+        :param customer_ids: PrestaShop ids of the customers
+        :return: summary of the import
+        """
+        records = dict(
+            (int(record['id']), record)
+            for record in self.backend_adapter.search_read({
+                'filter[id_customer]': '[%s]' % '|'.join(
+                    str(customer_id) for customer_id in customer_ids
+                ),
+            })
+        )
+        return self._import_chunk_records(sorted(records), records)
 
 
 @job(default_channel='root.prestashop')
@@ -15,6 +15,8 @@ from ...unit.importer import (
     import_batch,
     DelayedBatchImporter,
 )
+from ...unit.cache import job_cache
+from ...unit.mapper import unique_name
 from ...unit.exception import OrderImportRuleRetry
 from ...backend import prestashop
 
@@ -51,21 +53,57 @@ class SaleImportRule(ConnectorUnit):
     def _rule_paid(self, record, mode):
         """ Import the order only if it has received a payment """
         if self._get_paid_amount(record) == 0.0:
-            raise OrderImportRuleRetry('The order has not been paid.\n'
-                                       'The import will be retried later.')
+            raise OrderImportRuleRetry(
+                'The order has not been paid.\n'
+                'The import will be retried later.',
+                seconds=self.backend_record.payment_retry_interval * 60,
+            )
+
+    def _paid_amount_cache(self):
+        return job_cache(self.env, 'order_payments', transactional=False)
+
+    def prefetch_paid_amounts(self, records):
+        """ Read the payments of several orders with one request
+
+        The amounts are kept in the cache of the job, where
+        ``_get_paid_amount`` finds them.
+        """
+        references = set(record['reference'] for record in records)
+        if not references:
+            return
+        payment_adapter = self.unit_for(
+            GenericAdapter,
+            '__not_exist_prestashop.payment'
+        )
+        payments = payment_adapter.search_read({
+            'filter[order_reference]': '[%s]' % '|'.join(sorted(references))
+        })
+        paid_amounts = dict.fromkeys(references, 0.0)
+        for payment in payments:
+            if payment['order_reference'] in paid_amounts:
+                paid_amounts[payment['order_reference']] += \
+                    float(payment['amount'])
+        cache = self._paid_amount_cache()
+        for reference, paid_amount in paid_amounts.iteritems():
+            cache.set((self.backend_record.id, reference), paid_amount)
 
     def _get_paid_amount(self, record):
+        cache = self._paid_amount_cache()
+        key = (self.backend_record.id, record['reference'])
+        paid_amount = cache.get(key)
+        if paid_amount is not None:
+            return paid_amount
         payment_adapter = self.unit_for(
             GenericAdapter,
             '__not_exist_prestashop.payment'
         )
-        payment_ids = payment_adapter.search({
+        payments = payment_adapter.search_read({
             'filter[order_reference]': record['reference']
         })
         paid_amount = 0.0
-        for payment_id in payment_ids:
-            payment = payment_adapter.read(payment_id)
+        for payment in payments:
             paid_amount += float(payment['amount'])
+        cache.set(key, paid_amount)
         return paid_amount
 
     _rules = {
@@ -157,6 +195,15 @@ class SaleOrderMapper(ImportMapper):
         ('total_shipping_tax_excl', 'total_shipping_tax_excluded')
     ]
 
+    def __init__(self, environment):
+        """
+        :param environment: current environment (backend, session, ...)
+        :type environment: :py:class:`connector.connector.ConnectorEnvironment`
+        """
+        super(SaleOrderMapper, self).__init__(environment)
+        # lines and discounts read per order, see ``_get_order_details``
+        self._order_details = {}
+
     def _get_sale_order_lines(self, record):
         orders = record['associations'].get(
             'order_rows', {}).get(
@@ -168,13 +215,9 @@ class SaleOrderMapper(ImportMapper):
     def _get_discounts_lines(self, record):
         if record['total_discounts'] == '0.00':
             return []
-        adapter = self.unit_for(
-            GenericAdapter, 'prestashop.sale.order.line.discount')
-        discount_ids = adapter.search({'filter[id_order]': record['id']})
-        discount_mappers = []
-        for discount_id in discount_ids:
-            discount_mappers.append({'id': discount_id})
-        return discount_mappers
+        return self._get_order_details(
+            'prestashop.sale.order.line.discount', record['id']
+        ).values()
 
     children = [
         (_get_sale_order_lines,
@@ -191,10 +234,15 @@ class SaleOrderMapper(ImportMapper):
         else:
             child_records = source[from_attr]
 
+        details = {}
+        if child_records:
+            details = self._get_order_details(model_name, source['id'])
         children = []
         for child_record in child_records:
-            adapter = self.unit_for(GenericAdapter, model_name)
-            detail_record = adapter.read(child_record['id'])
+            detail_record = details.get(int(child_record['id']))
+            if detail_record is None:
+                adapter = self.unit_for(GenericAdapter, model_name)
+                detail_record = adapter.read(child_record['id'])
 
             mapper = self._get_map_child_unit(model_name)
             items = mapper.get_items(
@@ -203,23 +251,27 @@ class SaleOrderMapper(ImportMapper):
             children.extend(items)
         return children
 
-    def _sale_order_exists(self, name):
-        sale_order = self.env['sale.order'].search([
-            ('name', '=', name),
-            ('company_id', '=', self.backend_record.company_id.id),
-        ], limit=1)
-        return len(sale_order) == 1
+    def _get_order_details(self, model_name, order_id):
+        """ Read all the lines (or discounts) of an order with one request
+
+        :return: the records indexed by their (integer) id
+        :rtype: dict
+        """
+        key = (model_name, int(order_id))
+        if key not in self._order_details:
+            adapter = self.unit_for(GenericAdapter, model_name)
+            records = adapter.search_read({'filter[id_order]': order_id})
+            self._order_details[key] = dict(
+                (int(record['id']), record) for record in records
+            )
+        return self._order_details[key]
 
     @mapping
     def name(self, record):
-        basename = record['reference']
-        if not self._sale_order_exists(basename):
-            return {"name": basename}
-        i = 1
-        name = basename + '_%d' % (i)
-        while self._sale_order_exists(name):
-            i += 1
-            name = basename + '_%d' % (i)
+        name = unique_name(
+            self, 'sale.order', 'name', record['reference'],
+            domain=[('company_id', '=', self.backend_record.company_id.id)],
+        )
         return {"name": name}
 
     @mapping
@@ -381,9 +433,9 @@ class SaleOrderImporter(PrestashopImporter):
         )
 
     def _has_to_skip(self):
-        """ Return True if the import can be skipped """
+        """ Return the reason why the import can be skipped, if any """
         if self._get_binding():
-            return True
+            return _('Already imported.')
         rules = self.unit_for(SaleImportRule)
         try:
             return rules.check(self.prestashop_record)
@@ -397,6 +449,50 @@ class SaleOrderImporter(PrestashopImporter):
 @prestashop
 class SaleOrderBatchImporter(DelayedBatchImporter):
     _model_name = 'prestashop.sale.order'
+    keyset_pagination = True
+    chunk_size = 20
+
+    def _import_chunk_dependencies(self, records):
+        """ Import the customers, addresses, carriers and products of the
+        orders which are not imported yet and pass the import rules """
+        binder = self.binder_for()
+        imported = binder.to_internal_many(
+            [record['id'] for record in records]
+        )
+        records = [record for record in records
+                   if int(record['id']) not in imported]
+        rules = self.unit_for(SaleImportRule)
+        rules.prefetch_paid_amounts(records)
+        to_import = []
+        for record in records:
+            try:
+                rules.check(record)
+            except Exception:
+                # the import of the order reports why it is not imported
+                continue
+            to_import.append(record)
+        row_key = self.backend_record.get_version_ps_key('order_row')
+        customer_ids = set()
+        address_ids = set()
+        carrier_ids = set()
+        product_ids = set()
+        for record in to_import:
+            customer_ids.add(record['id_customer'])
+            address_ids.add(record['id_address_invoice'])
+            address_ids.add(record['id_address_delivery'])
+            carrier_ids.add(record['id_carrier'])
+            rows = record['associations'] \
+                .get('order_rows', {}) \
+                .get(row_key, [])
+            if isinstance(rows, dict):
+                rows = [rows]
+            product_ids.update(row['product_id'] for row in rows)
+        self._import_dependencies_many(customer_ids, 'prestashop.res.partner')
+        self._import_dependencies_many(address_ids, 'prestashop.address')
+        self._import_dependencies_many(carrier_ids,
+                                       'prestashop.delivery.carrier')
+        self._import_dependencies_many(product_ids,
+                                       'prestashop.product.template')
 
 
 @prestashop
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
+from odoo import _
 from odoo.addons.connector.unit.mapper import ImportMapper, mapping
 from ...unit.importer import PrestashopImporter, DelayedBatchImporter
 from ...backend import prestashop
@@ -50,7 +51,9 @@ class SaleOrderThreadImporter(PrestashopImporter):
             return 'no id_order'
         binder = self.binder_for('prestashop.sale.order')
         order_binding = binder.to_internal(record['id_order'])
-        return record['id_order'] == '0' or not order_binding
+        if record['id_order'] == '0' or not order_binding:
+            return _('The order %s is not imported.') % record['id_order']
+        return super(SaleOrderThreadImporter, self)._has_to_skip()
 
 
 @prestashop
@@ -95,7 +98,11 @@ class SaleOrderMessageImporter(PrestashopImporter):
             return 'no id_customer_thread'
         binder = self.binder_for('prestashop.sale.order.thread')
         order_binding = binder.to_internal(record['id_customer_thread'])
-        return record['id_customer_thread'] == '0' or not order_binding
+        if record['id_customer_thread'] == '0' or not order_binding:
+            return _('The thread %s is not imported.') % (
+                record['id_customer_thread'],
+            )
+        return super(SaleOrderMessageImporter, self)._has_to_skip()
 
 
 @prestashop
@@ -20,6 +20,60 @@ class StockLocation(models.Model):
         return prestashop_locations
 
 
+class PrestashopStockQueue(models.Model):
+    """ Products whose quantity must be exported to a backend
+
+    The quants only mark their products here, the quantities are
+    recomputed and exported later by one job per backend, scheduled by a
+    cron, see ``prestashop.backend.export_dirty_quantities``. A product is
+    queued once per backend until it is exported.
+    """
+    _name = 'prestashop.stock.queue'
+    _description = 'PrestaShop Stock Export Queue'
+
+    backend_id = fields.Many2one(
+        comodel_name='prestashop.backend',
+        string='PrestaShop Backend',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    product_id = fields.Many2one(
+        comodel_name='product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade',
+    )
+
+    _sql_constraints = [
+        ('backend_product_uniq', 'unique(backend_id, product_id)',
+         'A product is queued once per backend.'),
+    ]
+
+    @api.model
+    def mark_products(self, products):
+        """ Queue the export of the quantities of ``products`` on the
+        backends where they are bound
+
+        The products already queued are left as they are.
+        """
+        if not products:
+            return
+        self.env.cr.execute("""
+            INSERT INTO prestashop_stock_queue
+                (backend_id, product_id, create_uid, create_date,
+                 write_uid, write_date)
+            SELECT DISTINCT b.backend_id, p.id,
+                   %(uid)s, now() at time zone 'UTC',
+                   %(uid)s, now() at time zone 'UTC'
+            FROM product_product p
+            JOIN prestashop_product_template b
+                ON b.odoo_id = p.product_tmpl_id
+            WHERE p.id IN %(product_ids)s
+            ON CONFLICT DO NOTHING
+        """, {'uid': self.env.uid, 'product_ids': tuple(products.ids)})
+
+
 class StockQuant(models.Model):
     _inherit = 'stock.quant'
 
@@ -29,28 +83,30 @@ class StockQuant(models.Model):
         ps_locations = location_obj.get_prestashop_stock_locations()
         quant = super(StockQuant, self).create(vals)
         if quant.location_id in ps_locations:
-            quant.product_id.update_prestashop_qty()
+            self.env['prestashop.stock.queue'].mark_products(
+                quant.product_id)
         return quant
 
     @api.multi
     def write(self, vals):
         location_obj = self.env['stock.location']
         ps_locations = location_obj.get_prestashop_stock_locations()
-        for quant in self:
-            location = quant.location_id
-            res = super(StockQuant, self).write(vals)
-            if location in ps_locations:
-                quant.invalidate_cache()
-                quant.product_id.update_prestashop_qty()
-        if len(self) != 0:
-            return res
-        else:
-            return True
+        # the location may be changed by the write, mark the products of
+        # the quants which were or are in a synchronized location
+        products = self.filtered(
+            lambda x: x.location_id in ps_locations).mapped('product_id')
+        res = super(StockQuant, self).write(vals)
+        products |= self.filtered(
+            lambda x: x.location_id in ps_locations).mapped('product_id')
+        self.env['prestashop.stock.queue'].mark_products(products)
+        return res
 
     @api.multi
     def unlink(self):
         ps_locations = self.env['stock.location'].\
             get_prestashop_stock_locations()
-        self.filtered(lambda x: x.location_id in ps_locations).mapped(
-            'product_id').update_prestashop_qty()
-        return super(StockQuant, self).unlink()
+        products = self.filtered(
+            lambda x: x.location_id in ps_locations).mapped('product_id')
+        res = super(StockQuant, self).unlink()
+        self.env['prestashop.stock.queue'].mark_products(products)
+        return res
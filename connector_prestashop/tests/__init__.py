@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
 from . import test_auth
+from . import test_auto_matching
+from . import test_backend_adapter
+from . import test_batch_importer
+from . import test_binder
 from . import test_export_stock_qty
 from . import test_export_stock_qty_job
 from . import test_export_tracking
@@ -10,3 +14,5 @@ from . import test_import_inventory
 from . import test_import_partner
 from . import test_import_products
 from . import test_import_sale
+from . import test_json2dict
+from . import test_mapper
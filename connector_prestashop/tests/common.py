@@ -4,6 +4,8 @@
 
 import functools
 
+import mock
+
 import openerp.tests.common as common
 from odoo.addons.connector.connector import ConnectorEnvironment
 
@@ -14,6 +16,8 @@ import os
 from vcr import VCR
 import logging
 import urlparse
+
+from ..unit.backend_adapter import GenericAdapter
 _logger = logging.getLogger(__name__)
 try:
     from prestapyt.xml2dict import xml2dict
@@ -66,6 +70,22 @@ def quiet_logger(logger_path):
     logger.setLevel(level)
 
 
+@contextmanager
+def read_many_one_by_one():
+    """ Read the records of ``GenericAdapter.read_many`` one by one
+
+    The cassettes only contain the requests of ``read`` for each record.
+    The requests of ``read_many`` are tested in ``test_backend_adapter``.
+    """
+    def read_many(adapter, ids, attributes=None):
+        return dict((int(id_), adapter.read(id_, attributes=attributes))
+                    for id_ in ids)
+
+    with mock.patch.object(GenericAdapter, 'read_many', autospec=True,
+                           side_effect=read_many):
+        yield
+
+
 def assert_no_job_delayed(func):
     def _decorated(self, *args, **kwargs):
         job_count = self.env['queue.job'].search_count([])
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import mock
+
+from ..unit.auto_matching_importer import AutoMatchingImporter
+from ..unit.backend_adapter import GenericAdapter
+from .common import PrestashopTransactionCase
+
+
+class TestAutoMatching(PrestashopTransactionCase):
+
+    def _run(self, model_name, ps_records):
+        env = self.backend_record.get_environment(model_name)
+        importer = env.get_connector_unit(AutoMatchingImporter)
+        with mock.patch.object(GenericAdapter, 'search') as search, \
+                mock.patch.object(GenericAdapter, 'read_many') as read_many:
+            search.return_value = sorted(ps_records)
+            read_many.side_effect = lambda ids: dict(
+                (ps_id, ps_records[ps_id]) for ps_id in ids
+            )
+            importer.run()
+        return read_many
+
+    def test_match_currencies(self):
+        """ Currencies are matched on their ISO code """
+        self.create_binding_no_export(
+            'prestashop.res.currency', self.env.ref('base.EUR').id, 1
+        )
+        read_many = self._run('prestashop.res.currency', {
+            1: {'id': '1', 'iso_code': 'EUR', 'name': 'Euro'},
+            2: {'id': '2', 'iso_code': 'GBP', 'name': 'Pound'},
+            3: {'id': '3', 'iso_code': 'XX', 'name': 'Unknown'},
+        })
+        # already mapped records are not read
+        read_many.assert_called_once_with([2, 3])
+        bindings = self.env['prestashop.res.currency'].search([
+            ('backend_id', '=', self.backend_record.id),
+        ])
+        self.assertEqual(
+            {1: self.env.ref('base.EUR'), 2: self.env.ref('base.GBP')},
+            dict((binding.prestashop_id, binding.odoo_id)
+                 for binding in bindings)
+        )
+
+    def test_tax_candidate_keys(self):
+        """ Taxes are compared with the rates close to theirs """
+        env = self.backend_record.get_environment('prestashop.account.tax')
+        importer = env.get_connector_unit(AutoMatchingImporter)
+        index = importer._build_index([
+            {'id': 1, 'amount': 19.996},
+            {'id': 2, 'amount': 10.0},
+        ])
+        candidates = importer._candidates(index, '20.000')
+        self.assertEqual([1], [erp_dict['id'] for erp_dict in candidates])
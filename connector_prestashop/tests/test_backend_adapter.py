@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import io
+
+import mock
+
+from ..models.product_template.common import _tag_names
+from ..unit.backend_adapter import GenericAdapter, PrestaShopClientPool
+from .common import PrestashopTransactionCase
+
+
+class FakeClient(object):
+
+    def __init__(self, api_url, api_key, session=None):
+        self.api_url = api_url
+        self.client = session
+
+
+class TestClientPool(PrestashopTransactionCase):
+
+    def test_pool_reuse_client(self):
+        """ The same client is returned for the same backend """
+        pool = PrestaShopClientPool()
+        client1 = pool.get(1, 'http://ps/api/', 'key', client_class=FakeClient)
+        client2 = pool.get(1, 'http://ps/api/', 'key', client_class=FakeClient)
+        client3 = pool.get(2, 'http://ps/api/', 'key', client_class=FakeClient)
+        self.assertIs(client1, client2)
+        self.assertIsNot(client1, client3)
+        self.assertEqual(
+            {'hits': 1, 'misses': 2, 'clients': 2}, pool.stats()
+        )
+        self.assertEqual(('key', ''), client1.client.auth)
+
+    def test_pool_idle_timeout(self):
+        """ Clients unused for longer than the idle timeout are closed """
+        pool = PrestaShopClientPool()
+        time_path = ('odoo.addons.connector_prestashop.unit'
+                     '.backend_adapter.time.time')
+        with mock.patch(time_path) as time_mock:
+            time_mock.return_value = 1000.
+            client1 = pool.get(1, 'http://ps/api/', 'key',
+                               client_class=FakeClient, idle_timeout=60)
+            time_mock.return_value = 1100.
+            client2 = pool.get(1, 'http://ps/api/', 'key',
+                               client_class=FakeClient, idle_timeout=60)
+        self.assertIsNot(client1, client2)
+        self.assertEqual(2, pool.misses)
+
+
+class TestReadMany(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestReadMany, self).setUp()
+        env = self.backend_record.get_environment('prestashop.shop')
+        self.adapter = env.get_connector_unit(GenericAdapter)
+        self.adapter.client = mock.Mock()
+
+    def test_read_many_chunks(self):
+        """ Records are read by chunks with a filter on the ids """
+        self.adapter._read_many_chunk_size = 2
+        self.adapter.client.get.side_effect = [
+            {'shops': {'shop': [{'id': '1'}, {'id': '2'}]}},
+            {'shops': {'shop': {'id': '3'}}},
+        ]
+        records = self.adapter.read_many([1, 2, 3])
+        self.assertEqual([1, 2, 3], sorted(records))
+        self.assertEqual(
+            [mock.call('shops', options={'display': 'full',
+                                         'filter[id]': '[1|2]'}),
+             mock.call('shops', options={'display': 'full',
+                                         'filter[id]': '[3]'})],
+            self.adapter.client.get.call_args_list,
+        )
+
+    def test_read_many_empty(self):
+        """ An empty response returns no record """
+        self.adapter.client.get.return_value = {'shops': ''}
+        self.assertEqual({}, self.adapter.read_many([42]))
+
+    def test_search_read(self):
+        """ The records matching the filters are read at once """
+        self.adapter.client.get.return_value = {
+            'shops': {'shop': [{'id': '1'}, {'id': '2'}]},
+        }
+        records = self.adapter.search_read({'filter[id_shop_group]': '1'})
+        self.assertEqual([{'id': '1'}, {'id': '2'}], records)
+        self.adapter.client.get.assert_called_once_with(
+            'shops',
+            options={'display': 'full', 'filter[id_shop_group]': '1'},
+        )
+
+    def test_read_cached(self):
+        """ A record is read once in a job, until it is written """
+        self.adapter.client.get.return_value = {'shop': {'id': '1'}}
+        self.assertEqual({'id': '1'}, self.adapter.read(1))
+        record = self.adapter.read(1)
+        self.assertEqual({'id': '1'}, record)
+        self.assertEqual(1, self.adapter.client.get.call_count)
+        # the records returned are copies
+        record['name'] = 'changed'
+        self.assertEqual({'id': '1'}, self.adapter.read(1))
+        self.adapter.write(1, {'name': 'changed'})
+        self.adapter.read(1)
+        self.assertEqual(2, self.adapter.client.get.call_count)
+
+    def test_read_cache_records(self):
+        """ The records read at once are served by ``read`` as copies """
+        record = {'id': '7', 'name': 'Shop'}
+        self.adapter.cache_records([record])
+        self.assertEqual(record, self.adapter.read(7))
+        self.assertIsNot(record, self.adapter.read(7))
+        self.assertFalse(self.adapter.client.get.called)
+
+
+class TestIterSearchRead(PrestashopTransactionCase):
+
+    def test_iter_search_read(self):
+        """ Records are yielded while the response is parsed """
+        env = self.backend_record.get_environment('_import_stock_available')
+        adapter = env.get_connector_unit(GenericAdapter)
+        response = mock.Mock(status_code=200)
+        response.raw = io.BytesIO(
+            b'<?xml version="1.0" encoding="UTF-8"?>'
+            b'<prestashop xmlns:xlink="http://www.w3.org/1999/xlink">'
+            b'<stock_availables>'
+            b'<stock_available><id>1</id>'
+            b'<id_product xlink:href="http://ps/api/products/2">2'
+            b'</id_product></stock_available>'
+            b'<stock_available><id>3</id><id_product>4</id_product>'
+            b'</stock_available>'
+            b'</stock_availables></prestashop>'
+        )
+        with mock.patch.object(adapter.client.client, 'get') as get:
+            get.return_value = response
+            records = adapter.iter_search_read({'display': '[id,id_product]'})
+            self.assertEqual({'id': '1', 'id_product': '2'}, next(records))
+            self.assertEqual({'id': '3', 'id_product': '4'}, next(records))
+            with self.assertRaises(StopIteration):
+                next(records)
+        self.assertTrue(get.call_args[1]['stream'])
+        self.assertTrue(response.close.called)
+
+
+class TestExportQuantities(PrestashopTransactionCase):
+
+    def test_export_quantities_diff(self):
+        """ Only the stock records having a different quantity are written """
+        env = self.backend_record.get_environment('_import_stock_available')
+        adapter = env.get_connector_unit(GenericAdapter)
+        adapter.client = mock.Mock()
+        stocks = [
+            {'id': '1', 'id_product': '1', 'id_product_attribute': '0',
+             'quantity': '5'},
+            {'id': '2', 'id_product': '2', 'id_product_attribute': '3',
+             'quantity': '7', 'location': 'A1'},
+            {'id': '3', 'id_product': '4', 'id_product_attribute': '0',
+             'quantity': '1'},
+        ]
+        with mock.patch.object(type(adapter), 'iter_search_read') as search:
+            search.return_value = iter(stocks)
+            report = adapter.export_quantities({(1, 0): 5, (2, 3): 9})
+        self.assertEqual({'pushed': 1, 'skipped': 1}, report)
+        self.assertEqual('full', search.call_args[0][0]['display'])
+        # the record is written back with all its fields
+        adapter.client.edit.assert_called_once_with('stock_availables', {
+            'stock_available': {'id': '2', 'id_product': '2',
+                                'id_product_attribute': '3', 'quantity': 9,
+                                'location': 'A1'},
+        })
+
+    def test_export_quantities_products(self):
+        """ Only the stock records of the given products are read """
+        env = self.backend_record.get_environment('_import_stock_available')
+        adapter = env.get_connector_unit(GenericAdapter)
+        adapter.client = mock.Mock()
+        with mock.patch.object(type(adapter), 'iter_search_read') as search:
+            search.return_value = iter([])
+            adapter.export_quantities({(1, 0): 5, (2, 3): 9},
+                                      product_ids={1, 2})
+        self.assertEqual('[1|2]', search.call_args[0][0]['filter[id_product]'])
+
+
+class TestTagNames(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestTagNames, self).setUp()
+        env = self.backend_record.get_environment('_prestashop_product_tag')
+        self.adapter = env.get_connector_unit(GenericAdapter)
+        _tag_names.pop((self.env.cr.dbname, self.backend_record.id), None)
+
+    def test_tag_names_cached(self):
+        """ The tags are read at once, the new ones when they are asked """
+        with mock.patch.object(type(self.adapter), 'search') as search:
+            search.side_effect = [
+                [{'id': '1', 'name': 'summer'}, {'id': '2', 'name': 'blue'}],
+                [{'id': '3', 'name': 'new'}],
+            ]
+            self.assertEqual(['blue', 'summer'],
+                             self.adapter.get_names(['2', '1']))
+            self.assertEqual(1, search.call_count)
+            self.assertEqual(['summer', 'new'],
+                             self.adapter.get_names(['1', '3', '4']))
+            self.assertEqual(['new'], self.adapter.get_names(['3', '4']))
+        self.assertEqual(2, search.call_count)
+        self.assertEqual('[3|4]', search.call_args[0][0]['filter[id]'])
@@ -0,0 +1,563 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import mock
+
+from ..models.product_product.importer import ProductCombinationImporter
+from ..models.product_category.importer import (
+    ProductCategoryImporter,
+    sort_parents_first,
+)
+from ..unit.backend_adapter import GenericAdapter
+from ..unit.exception import OrderImportRuleRetry
+from ..unit.importer import BatchImporter, PrestashopImporter
+from .common import PrestashopTransactionCase
+
+
+class TestKeysetPagination(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestKeysetPagination, self).setUp()
+        env = self.backend_record.get_environment('prestashop.res.partner')
+        self.importer = env.get_connector_unit(BatchImporter)
+        self.importer.page_size = 2
+        self.importer.chunk_size = None
+
+    def _run(self, search_results):
+        with mock.patch.object(GenericAdapter, 'search') as search, \
+                mock.patch.object(type(self.importer),
+                                  '_import_record') as import_record:
+            search.side_effect = search_results
+            self.importer.run(filters={'filter[date_upd]': '>[2016-01-01]'})
+        return search, import_record
+
+    def test_keyset_pages(self):
+        """ Pages start after the last id of the previous page """
+        search, import_record = self._run([[1, 3], [7, 9], [10]])
+        self.assertEqual(5, import_record.call_count)
+        filters = [call[0][0] for call in search.call_args_list]
+        # the same dict is updated between the pages
+        self.assertEqual('>[9]', filters[-1]['filter[id]'])
+        self.assertEqual('[id_ASC]', filters[-1]['sort'])
+        self.assertEqual('2', filters[-1]['limit'])
+        # the cursor is removed once the batch import is done
+        self.assertFalse(self.env['prestashop.import.cursor'].search([]))
+
+    def test_keyset_resume(self):
+        """ An interrupted batch import restarts after the last page """
+        with self.assertRaises(ValueError):
+            self._run([[1, 3], ValueError()])
+        cursor = self.env['prestashop.import.cursor'].search([])
+        self.assertEqual(3, cursor.last_id)
+        search, __ = self._run([[4]])
+        self.assertEqual('>[3]', search.call_args[0][0]['filter[id]'])
+
+
+class TestChunkImport(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestChunkImport, self).setUp()
+        env = self.backend_record.get_environment('prestashop.res.partner')
+        self.importer = env.get_connector_unit(BatchImporter)
+        self.importer.chunk_size = 2
+
+    def _delayed_jobs(self, method_name):
+        return self.env['queue.job'].search([
+            ('model_name', '=', 'prestashop.res.partner'),
+            ('method_name', '=', method_name),
+        ])
+
+    def test_delay_chunks(self):
+        """ One job is delayed per chunk of records """
+        with mock.patch.object(GenericAdapter, 'search') as search:
+            search.return_value = [1, 2, 3]
+            self.importer._run_page({})
+        jobs = self._delayed_jobs('import_records')
+        self.assertEqual(2, len(jobs))
+        self.assertFalse(self._delayed_jobs('import_record'))
+
+    def test_import_chunk_failure(self):
+        """ Records failing in a chunk are delayed alone """
+        def run(importer, prestashop_id, **kwargs):
+            if prestashop_id == 2:
+                raise ValueError('error')
+            if prestashop_id == 3:
+                return 'skipped'
+
+        with mock.patch.object(GenericAdapter, 'read_many') as read_many, \
+                mock.patch.object(PrestashopImporter, 'run',
+                                  autospec=True) as importer_run:
+            read_many.return_value = {1: {'id': '1'}}
+            importer_run.side_effect = run
+            result = self.importer.import_chunk([1, 2, 3])
+        self.assertEqual(
+            {'id': '1'},
+            importer_run.call_args_list[0][1]['prestashop_record']
+        )
+        self.assertEqual(
+            u'1 imported, 1 skipped, 0 postponed, 1 failed and delayed '
+            u'separately ([2])',
+            result
+        )
+        self.assertEqual(1, len(self._delayed_jobs('import_record')))
+
+    def test_import_chunk_postponed(self):
+        """ Records to retry later are delayed alone with the delay """
+        with mock.patch.object(GenericAdapter, 'read_many') as read_many, \
+                mock.patch.object(PrestashopImporter, 'run') as importer_run:
+            read_many.return_value = {}
+            importer_run.side_effect = OrderImportRuleRetry('not paid',
+                                                            seconds=600)
+            result = self.importer.import_chunk([1])
+        self.assertEqual(
+            u'0 imported, 0 skipped, 1 postponed, 0 failed and delayed '
+            u'separately ([])',
+            result
+        )
+        job = self._delayed_jobs('import_record')
+        self.assertEqual(1, len(job))
+        self.assertTrue(job.eta)
+        # the customer imports its addresses when it is retried alone
+        self.assertNotIn('import_addresses', job.kwargs)
+
+
+class TestSkipUnchanged(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestSkipUnchanged, self).setUp()
+        self.create_binding_no_export(
+            'prestashop.product.category',
+            self.env.ref('product.product_category_all').id,
+            5,
+            date_upd='2016-09-01 10:00:00',
+        )
+        env = self.backend_record.get_environment(
+            'prestashop.product.category'
+        )
+        self.importer = env.get_connector_unit(PrestashopImporter)
+        self.importer.prestashop_id = 5
+
+    def _has_to_skip(self, date_upd):
+        self.importer.prestashop_record = {'id': '5', 'date_upd': date_upd}
+        return self.importer._has_to_skip()
+
+    def test_skip_unchanged(self):
+        """ Records not modified since the last import are skipped """
+        self.assertTrue(self._has_to_skip('2016-09-01 10:00:00'))
+        self.assertTrue(self._has_to_skip('2016-08-01 10:00:00'))
+
+    def test_import_modified(self):
+        """ Records modified or without update date are imported """
+        self.assertFalse(self._has_to_skip('2016-09-01 10:00:01'))
+        self.assertFalse(self._has_to_skip('0000-00-00 00:00:00'))
+
+    def test_import_forced(self):
+        """ Records are imported when it is forced, e.g. by a resync """
+        self.importer.force = True
+        self.assertFalse(self._has_to_skip('2016-09-01 10:00:00'))
+
+    def test_run_returns_skip_reason(self):
+        """ The import of a single record returns why it is skipped """
+        with mock.patch.object(type(self.importer),
+                               '_import_dependencies') as dependencies:
+            result = self.importer.run(
+                5, prestashop_record={'id': '5',
+                                      'date_upd': '2016-09-01 10:00:00'},
+            )
+        self.assertIn('Already up-to-date', result)
+        self.assertFalse(dependencies.called)
+
+
+class TestImportDependenciesMany(PrestashopTransactionCase):
+
+    def test_import_missing_dependencies(self):
+        """ Only the missing dependencies are read and imported """
+        self.create_binding_no_export(
+            'prestashop.product.category',
+            self.env.ref('product.product_category_all').id,
+            5,
+        )
+        env = self.backend_record.get_environment('prestashop.sale.order')
+        importer = env.get_connector_unit(BatchImporter)
+
+        def run(importer, prestashop_id, **kwargs):
+            if prestashop_id == 7:
+                raise ValueError('error')
+
+        with mock.patch.object(GenericAdapter, 'read_many') as read_many, \
+                mock.patch.object(PrestashopImporter, 'run',
+                                  autospec=True) as importer_run:
+            read_many.return_value = {6: {'id': '6'}, 7: {'id': '7'}}
+            importer_run.side_effect = run
+            # the failure of 7 is left to the importer of the record
+            # depending on it
+            importer._import_dependencies_many(
+                ['5', '6', '7', '0'], 'prestashop.product.category'
+            )
+        read_many.assert_called_once_with([6, 7])
+        self.assertEqual(
+            [6, 7],
+            [call[0][1] for call in importer_run.call_args_list]
+        )
+        self.assertEqual(
+            {'id': '6'},
+            importer_run.call_args_list[0][1]['prestashop_record']
+        )
+
+
+class TestOptionValues(PrestashopTransactionCase):
+
+    def test_option_values_read_once(self):
+        """ The option values are read once in a job, only when referenced """
+        env = self.backend_record.get_environment(
+            'prestashop.product.combination'
+        )
+        importer = env.get_connector_unit(PrestashopImporter)
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(GenericAdapter, 'read_many') as read_many:
+            read_many.side_effect = [
+                {1: {'id': '1', 'id_attribute_group': '1'},
+                 3: {'id': '3', 'id_attribute_group': '1'}},
+                {2: {'id': '2', 'id_attribute_group': '2'}},
+            ]
+            values = importer._get_option_values([1, 3])
+            self.assertEqual([1, 3], sorted(values))
+            values = importer._get_option_values([2, 3])
+            self.assertEqual([2, 3], sorted(values))
+        self.assertFalse(search_read.called)
+        self.assertEqual([mock.call([1, 3]), mock.call([2])],
+                         read_many.call_args_list)
+
+
+class TestImportCombinations(PrestashopTransactionCase):
+
+    def test_import_combinations_at_once(self):
+        """ The combinations of a template are read with one request """
+        binding = mock.Mock()
+        env = self.backend_record.get_environment(
+            'prestashop.product.template'
+        )
+        importer = env.get_connector_unit(PrestashopImporter)
+        ps_key = self.backend_record.get_version_ps_key('combinations')
+        importer.prestashop_record = {
+            'id': '1',
+            'id_default_combination': {'value': '3'},
+            'associations': {
+                'combinations': {ps_key: [{'id': '2'}, {'id': '3'}]},
+            },
+        }
+        records = {
+            2: {'id': '2', 'associations': {'images': {'image': []}}},
+            3: {'id': '3', 'associations': {'images': {'image': []}}},
+        }
+        with mock.patch.object(GenericAdapter, 'read_many') as read_many, \
+                mock.patch.object(ProductCombinationImporter,
+                                  'import_template_combinations') as import_:
+            read_many.return_value = records
+            importer.import_combinations(binding)
+        read_many.assert_called_once_with(['3', '2'])
+        # the default combination first
+        import_.assert_called_once_with([records[3], records[2]])
+        # supplier info and images in a job, with the images read
+        binding.with_delay().import_combinations_details.assert_called_with(
+            combinations=[records[3], records[2]],
+        )
+
+    def test_import_template_combinations(self):
+        """ The combinations are created or updated in one pass """
+        template = self.env['product.template'].create({'name': 'Shirt'})
+        template_binding = self.create_binding_no_export(
+            'prestashop.product.template', template.id, 1,
+        )
+        binding = self.create_binding_no_export(
+            'prestashop.product.combination',
+            template.product_variant_ids.id, 2,
+            main_template_id=template_binding.id,
+        )
+        env = self.backend_record.get_environment(
+            'prestashop.product.combination'
+        )
+        importer = env.get_connector_unit(PrestashopImporter)
+        records = [{'id': '3', 'id_product': '1'},
+                   {'id': '2', 'id_product': '1'}]
+        importer_class = type(importer)
+        with mock.patch.object(importer_class,
+                               '_import_option_values') as option_values, \
+                mock.patch.object(importer_class,
+                                  '_check_many_in_new_connector_env'
+                                  ) as check, \
+                mock.patch.object(type(importer), '_import') as import_, \
+                mock.patch.object(PrestashopImporter, 'run') as run:
+            result = importer.import_template_combinations(records)
+        self.assertEqual({'created': 1, 'updated': 1}, result)
+        option_values.assert_called_once_with(records)
+        check.assert_called_once_with([3])
+        self.assertEqual([mock.call(None), mock.call(binding)],
+                         import_.call_args_list)
+        self.assertFalse(run.called)
+
+
+class TestSyncSupplierInfo(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestSyncSupplierInfo, self).setUp()
+        template = self.env['product.template'].create({'name': 'Shirt'})
+        self.create_binding_no_export(
+            'prestashop.product.template', template.id, 1,
+        )
+        partner = self.env['res.partner'].create({'name': 'Supplier'})
+        self.supplierinfos = {}
+        for prestashop_id in (10, 11):
+            supplierinfo = self.env['product.supplierinfo'].create({
+                'name': partner.id,
+                'product_tmpl_id': template.id,
+            })
+            self.supplierinfos[prestashop_id] = supplierinfo
+            self.create_binding_no_export(
+                'prestashop.product.supplierinfo', supplierinfo.id,
+                prestashop_id,
+            )
+
+    def test_sync_product(self):
+        """ Only the differences with PrestaShop are imported or deleted """
+        env = self.backend_record.get_environment(
+            'prestashop.product.supplierinfo'
+        )
+        importer = env.get_connector_unit(BatchImporter)
+        records = [
+            {'id': '10', 'id_product': '1', 'id_product_attribute': '0'},
+            {'id': '12', 'id_product': '1', 'id_product_attribute': '0'},
+        ]
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(type(importer), '_is_changed') as changed, \
+                mock.patch.object(PrestashopImporter, 'run') as run:
+            search_read.return_value = records
+            changed.return_value = False
+            result = importer.sync_product(1)
+        search_read.assert_called_once_with({'filter[id_product]': 1})
+        self.assertEqual(
+            {'created': 1, 'updated': 0, 'deleted': 1, 'failed': 0}, result)
+        run.assert_called_once_with(12, prestashop_record=records[1])
+        self.assertTrue(self.supplierinfos[10].exists())
+        self.assertFalse(self.supplierinfos[11].exists())
+
+    def test_sync_product_failure(self):
+        """ A record which fails is delayed, the others are imported """
+        env = self.backend_record.get_environment(
+            'prestashop.product.supplierinfo'
+        )
+        importer = env.get_connector_unit(BatchImporter)
+        records = [
+            {'id': '10', 'id_product': '1', 'id_product_attribute': '0'},
+            {'id': '11', 'id_product': '1', 'id_product_attribute': '0'},
+            {'id': '12', 'id_product': '1', 'id_product_attribute': '0'},
+        ]
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(type(importer), '_is_changed') as changed, \
+                mock.patch.object(type(importer),
+                                  '_import_record') as import_record, \
+                mock.patch.object(PrestashopImporter, 'run') as run:
+            search_read.return_value = records
+            changed.return_value = True
+            run.side_effect = [None, ValueError('broken'), None]
+            result = importer.sync_product(1)
+        self.assertEqual(
+            {'created': 1, 'updated': 1, 'deleted': 0, 'failed': 1}, result)
+        self.assertEqual(3, run.call_count)
+        import_record.assert_called_once_with(11)
+
+    def test_sync_product_empty(self):
+        """ Nothing is deleted when PrestaShop returns no supplier info """
+        env = self.backend_record.get_environment(
+            'prestashop.product.supplierinfo'
+        )
+        importer = env.get_connector_unit(BatchImporter)
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read:
+            search_read.return_value = []
+            result = importer.sync_product(1)
+        self.assertEqual(
+            {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}, result)
+        self.assertTrue(self.supplierinfos[10].exists())
+        self.assertTrue(self.supplierinfos[11].exists())
+
+    def test_sync_combination(self):
+        """ The supplier info of a combination are imported, the other
+        ones of the product are kept """
+        env = self.backend_record.get_environment(
+            'prestashop.product.supplierinfo'
+        )
+        importer = env.get_connector_unit(BatchImporter)
+        records = [
+            {'id': '12', 'id_product': '1', 'id_product_attribute': '2'},
+        ]
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(PrestashopImporter, 'run') as run:
+            search_read.return_value = records
+            result = importer.sync_combination(2)
+        search_read.assert_called_once_with(
+            {'filter[id_product_attribute]': 2}
+        )
+        self.assertEqual(
+            {'created': 1, 'updated': 0, 'deleted': 0, 'failed': 0}, result)
+        run.assert_called_once_with(12, prestashop_record=records[0])
+        self.assertTrue(self.supplierinfos[10].exists())
+        self.assertTrue(self.supplierinfos[11].exists())
+
+
+class TestCategoryTree(PrestashopTransactionCase):
+
+    def test_sort_parents_first(self):
+        """ The parent categories are sorted before their children """
+        records = [
+            {'id': '5', 'id_parent': '3'},
+            {'id': '2', 'id_parent': '1'},
+            {'id': '3', 'id_parent': '2'},
+            {'id': '4', 'id_parent': '8'},
+            {'id': '1', 'id_parent': '0'},
+        ]
+        self.assertEqual(
+            ['1', '2', '3', '5', '4'],
+            [record['id'] for record in sort_parents_first(records)],
+        )
+
+    def test_import_tree(self):
+        """ The categories are read at once and imported parents first """
+        env = self.backend_record.get_environment(
+            'prestashop.product.category'
+        )
+        importer = env.get_connector_unit(BatchImporter)
+        records = [{'id': '3', 'id_parent': '2'},
+                   {'id': '2', 'id_parent': '1'}]
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(ProductCategoryImporter,
+                                  'import_tree') as import_tree, \
+                mock.patch.object(type(importer),
+                                  '_import_record') as import_record:
+            search_read.return_value = records
+            import_tree.return_value = ([2], [], [3])
+            importer.run()
+        search_read.assert_called_once_with(
+            {'sort': '[id_ASC]', 'limit': '5000'}
+        )
+        import_tree.assert_called_once_with(records)
+        # the failed ones are delayed alone
+        import_record.assert_called_once_with(3)
+
+    def test_import_tree_one_pass(self):
+        """ The categories are imported in one pass with their parents
+        taken from the categories imported before """
+        root = self.env['product.category'].create({'name': 'Root'})
+        self.create_binding_no_export(
+            'prestashop.product.category', root.id, 1,
+        )
+        env = self.backend_record.get_environment(
+            'prestashop.product.category'
+        )
+        importer = env.get_connector_unit(PrestashopImporter)
+        records = [{'id': '3', 'id_parent': '2'},
+                   {'id': '2', 'id_parent': '1'},
+                   {'id': '5', 'id_parent': '4'},
+                   {'id': '6', 'id_parent': '5'}]
+        parents = []
+        categories = {}
+
+        def import_(binding, **kwargs):
+            # the parent given to the mapper
+            parents.append(importer.parent_ids.get(
+                int(importer.prestashop_record['id_parent'])
+            ))
+            category = self.env['product.category'].create({
+                'name': importer.prestashop_record['id'],
+            })
+            categories[importer.prestashop_id] = category
+            importer.binder.bind(
+                importer.prestashop_id,
+                self.create_binding_no_export(
+                    'prestashop.product.category', category.id,
+                ),
+            )
+
+        importer_class = type(importer)
+        with mock.patch.object(importer_class,
+                               '_check_many_in_new_connector_env') as check, \
+                mock.patch.object(importer_class, '_import',
+                                  side_effect=import_), \
+                mock.patch.object(PrestashopImporter, 'run') as run:
+            imported, skipped, failed = importer.import_tree(records)
+        check.assert_called_once_with([2, 3, 5, 6])
+        self.assertFalse(run.called)
+        self.assertEqual([2, 3], imported)
+        self.assertEqual([root.id, categories[2].id], parents)
+        # the parent 4 is not imported, it is imported with 5 in its job
+        self.assertEqual([5, 6], failed)
+
+
+class TestImportCustomersAddresses(PrestashopTransactionCase):
+
+    def test_import_addresses_at_once(self):
+        """ The addresses of the customers of a chunk are read at once """
+        env = self.backend_record.get_environment('prestashop.address')
+        importer = env.get_connector_unit(BatchImporter)
+        records = [{'id': '4', 'id_customer': '1'},
+                   {'id': '3', 'id_customer': '2'}]
+        with mock.patch.object(GenericAdapter, 'search_read') as search_read, \
+                mock.patch.object(PrestashopImporter, 'run') as importer_run:
+            search_read.return_value = records
+            importer_run.return_value = None
+            result = importer.import_customers_addresses([1, 2])
+        search_read.assert_called_once_with({'filter[id_customer]': '[1|2]'})
+        self.assertEqual(
+            [mock.call(3, prestashop_record=records[1]),
+             mock.call(4, prestashop_record=records[0])],
+            importer_run.call_args_list,
+        )
+        self.assertEqual(
+            u'2 imported, 0 skipped, 0 postponed, 0 failed and delayed '
+            u'separately ([])',
+            result
+        )
+
+
+class TestTranslatableRecord(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestTranslatableRecord, self).setUp()
+        self.lang_binding = self.create_binding_no_export(
+            'prestashop.res.lang', self.env.ref('base.lang_en').id, 1,
+        )
+        env = self.backend_record.get_environment(
+            'prestashop.product.category'
+        )
+        self.importer = env.get_connector_unit(PrestashopImporter)
+
+    def test_split_per_language(self):
+        """ The record is split in views with the values of a language """
+        record = {'id': '5', 'id_parent': '2'}
+        for field in ('name', 'description', 'link_rewrite',
+                      'meta_description', 'meta_keywords', 'meta_title'):
+            record[field] = {
+                'language': {'attrs': {'id': '1'}, 'value': field.upper()},
+            }
+        split_record = self.importer._split_per_language(
+            record, fields=['name']
+        )
+        self.assertEqual(['en_US'], split_record.keys())
+        self.assertEqual('NAME', split_record['en_US']['name'])
+        self.assertEqual('2', split_record['en_US']['id_parent'])
+        # the other fields are not copied
+        self.assertIs(record['description'],
+                      split_record['en_US']['description'])
+        self.assertEqual(len(record), len(split_record['en_US']))
+
+    def test_language_codes_invalidated(self):
+        """ The languages are cached until a language binding changes """
+        lang_model = self.env['prestashop.res.lang']
+        self.assertEqual(
+            {'1': 'en_US'},
+            lang_model._get_language_codes(self.backend_record.id),
+        )
+        self.lang_binding.prestashop_id = 3
+        self.assertEqual(
+            {'3': 'en_US'},
+            lang_model._get_language_codes(self.backend_record.id),
+        )
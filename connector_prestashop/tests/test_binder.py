@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import mock
+
+from odoo.addons.connector.connector import Binder
+
+from ..unit.cache import LRUCache
+from .common import PrestashopTransactionCase
+
+
+class TestBinderCache(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestBinderCache, self).setUp()
+        env = self.backend_record.get_environment('prestashop.res.country')
+        self.binder = env.get_connector_unit(Binder)
+        self.binding = self.create_binding_no_export(
+            'prestashop.res.country', self.env.ref('base.fr').id, 8
+        )
+
+    def test_to_internal_cached(self):
+        """ The bindings found are not searched again in the job """
+        self.assertEqual(self.binding, self.binder.to_internal(8))
+        with mock.patch.object(Binder, 'to_internal') as to_internal:
+            self.assertEqual(self.binding, self.binder.to_internal('8'))
+            self.assertFalse(to_internal.called)
+        self.assertEqual(self.env.ref('base.fr'),
+                         self.binder.to_internal(8, unwrap=True))
+
+    def test_bind_invalidates(self):
+        """ Binding an external ID invalidates the cached lookups """
+        self.assertEqual(self.binding, self.binder.to_internal(8))
+        self.binder.bind(9, self.binding)
+        self.assertFalse(self.binder.to_internal(8))
+        self.assertEqual(self.binding, self.binder.to_internal(9))
+        self.assertEqual(
+            9, self.binder.to_external(self.env.ref('base.fr').id, wrap=True)
+        )
+
+    def test_unlink_invalidates(self):
+        """ Deleting a binding drops its cached lookups """
+        self.assertEqual(self.binding, self.binder.to_internal(8))
+        self.binding.unlink()
+        self.assertFalse(self.binder.to_internal(8))
+        self.assertFalse(self.binder.to_internal_many([8]))
+
+    def test_cascade_invalidates(self):
+        """ A binding deleted with its Odoo record is not returned """
+        category = self.env['product.category'].create({'name': 'Shirts'})
+        binding = self.create_binding_no_export(
+            'prestashop.product.category', category.id, 3
+        )
+        env = self.backend_record.get_environment(
+            'prestashop.product.category'
+        )
+        binder = env.get_connector_unit(Binder)
+        self.assertEqual(binding, binder.to_internal(3))
+        self.assertEqual(3, binder.to_external(category.id, wrap=True))
+        # the binding is deleted by the database, not by its unlink()
+        category.unlink()
+        self.assertFalse(binder.to_internal(3))
+        self.assertFalse(binder.to_internal_many([3]))
+        self.assertIsNone(binder.to_external(category.id, wrap=True))
+
+    def test_to_internal_many(self):
+        """ A list of external IDs is resolved at once """
+        uk_binding = self.create_binding_no_export(
+            'prestashop.res.country', self.env.ref('base.uk').id, 17
+        )
+        result = self.binder.to_internal_many(['8', 17, 42])
+        self.assertEqual({8: self.binding, 17: uk_binding}, result)
+        result = self.binder.to_internal_many([8, 17], unwrap=True)
+        self.assertEqual(self.env.ref('base.uk'), result[17])
+
+
+class TestLRUCache(PrestashopTransactionCase):
+
+    def test_lru(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(2, len(cache))
@@ -4,7 +4,10 @@
 
 import mock
 
-from ..models.product_template.exporter import export_product_quantities
+from ..models.product_template.exporter import (
+    ProductInventoryBulkExporter,
+    export_product_quantities,
+)
 from .common import (
     ExportStockQuantityCase,
     assert_no_job_delayed
@@ -59,3 +62,163 @@ class TestExportStockQuantity(ExportStockQuantityCase):
                 fields=['quantity'],
                 priority=20,
             )
+
+    def test_quant_queue_product(self):
+        """ Quants changes queue their products, once, and nothing else """
+        variant_binding = self._create_product_binding(
+            name='Faded Short Sleeves T-shirt',
+            template_ps_id=1,
+            variant_ps_id=1,
+        )
+        location = (self.backend_record.stock_location_id or
+                    self.backend_record.warehouse_id.lot_stock_id)
+        location.prestashop_synchronized = True
+        backend_model = type(self.backend_record)
+        with mock.patch.object(backend_model,
+                               'schedule_dirty_quantities_export') as schedule:
+            self._change_product_qty(variant_binding.odoo_id, 42)
+            self._change_product_qty(variant_binding.odoo_id, 40)
+        self.assertFalse(schedule.called)
+        queued = self.env['prestashop.stock.queue'].search([
+            ('backend_id', '=', self.backend_record.id),
+        ])
+        self.assertEqual(1, len(queued))
+        self.assertEqual(variant_binding.odoo_id, queued.product_id)
+
+    def test_scheduler_export_dirty_quantities(self):
+        """ The cron schedules the export of the backends with a queue """
+        variant_binding = self._create_product_binding(
+            name='Faded Short Sleeves T-shirt',
+            template_ps_id=1,
+            variant_ps_id=1,
+        )
+        backend_model = self.env['prestashop.backend']
+        with mock.patch.object(type(backend_model),
+                               'schedule_dirty_quantities_export',
+                               autospec=True) as schedule:
+            backend_model._scheduler_export_dirty_quantities()
+            self.assertFalse(schedule.call_args[0][0])
+            self.env['prestashop.stock.queue'].mark_products(
+                variant_binding.odoo_id
+            )
+            backend_model._scheduler_export_dirty_quantities()
+            self.assertEqual(self.backend_record, schedule.call_args[0][0])
+
+    @assert_no_job_delayed
+    def test_export_dirty_quantities_once(self):
+        """ The queued products are recomputed and exported at once """
+        variant_binding = self._create_product_binding(
+            name='Faded Short Sleeves T-shirt',
+            template_ps_id=1,
+            variant_ps_id=1,
+        )
+        location = (self.backend_record.stock_location_id or
+                    self.backend_record.warehouse_id.lot_stock_id)
+        location.prestashop_synchronized = True
+        self._change_product_qty(variant_binding.odoo_id, 42)
+        with mock.patch.object(ProductInventoryBulkExporter, 'run') as run:
+            run.return_value = 'exported'
+            self.backend_record.export_dirty_quantities()
+        run.assert_called_once_with(
+            templates=variant_binding.main_template_id,
+            combinations=variant_binding,
+        )
+        self.assertEqual(42, variant_binding.quantity)
+        self.assertFalse(self.env['prestashop.stock.queue'].search([
+            ('backend_id', '=', self.backend_record.id),
+        ]))
+
+    def test_recompute_prestashop_qty(self):
+        """ Quantities are computed on the synchronized locations """
+        variant_binding = self._create_product_binding(
+            name='Faded Short Sleeves T-shirt',
+            template_ps_id=1,
+            variant_ps_id=1,
+        )
+        template_binding = variant_binding.main_template_id
+        location = (self.backend_record.stock_location_id or
+                    self.backend_record.warehouse_id.lot_stock_id)
+        self._change_product_qty(variant_binding.odoo_id, 42)
+        other_location = self.env['stock.location'].create({
+            'name': 'Not synchronized',
+            'usage': 'internal',
+        })
+        self.env['stock.quant'].create({
+            'product_id': variant_binding.odoo_id.id,
+            'location_id': other_location.id,
+            'qty': 10,
+        })
+        location.prestashop_synchronized = True
+
+        variant_binding.with_context(
+            connector_no_export=True).recompute_prestashop_qty()
+        template_binding.with_context(
+            connector_no_export=True).recompute_prestashop_qty()
+        self.assertEqual(42, variant_binding.quantity)
+        self.assertEqual(42, template_binding.quantity)
+
+    def test_recompute_prestashop_qty_variants(self):
+        """ The quantities computed by set are the ones computed before
+        one binding at a time """
+        attribute = self.env['product.attribute'].create({'name': 'Size'})
+        value_ids = [
+            self.env['product.attribute.value'].create({
+                'name': name,
+                'attribute_id': attribute.id,
+            }).id
+            for name in ('S', 'M')
+        ]
+        template = self.env['product.template'].create({
+            'name': 'Shirt',
+            'type': 'product',
+            'attribute_line_ids': [(0, 0, {
+                'attribute_id': attribute.id,
+                'value_ids': [(6, 0, value_ids)],
+            })],
+        })
+        template_binding = self.create_binding_no_export(
+            'prestashop.product.template', template.id,
+            prestashop_id=1, default_shop_id=self.shop.id,
+        )
+        variants = template.product_variant_ids
+        combinations = self.env['prestashop.product.combination']
+        for prestashop_id, variant in enumerate(variants, 1):
+            combinations |= self.create_binding_no_export(
+                'prestashop.product.combination', variant.id,
+                prestashop_id=prestashop_id,
+                main_template_id=template_binding.id,
+            )
+        warehouse = self.backend_record.warehouse_id
+        warehouse.lot_stock_id.prestashop_synchronized = True
+        self._change_product_qty(variants[0], 5)
+        self._change_product_qty(variants[1], 3)
+        # in the warehouse, but not synchronized
+        other_location = self.env['stock.location'].create({
+            'name': 'Not synchronized',
+            'usage': 'internal',
+            'location_id': warehouse.view_location_id.id,
+        })
+        self.env['stock.quant'].create({
+            'product_id': variants[0].id,
+            'location_id': other_location.id,
+            'qty': 10,
+        })
+
+        template_binding.with_context(
+            connector_no_export=True).recompute_prestashop_qty()
+        combinations.recompute_prestashop_qty()
+
+        locations = self.env['stock.location'].search([
+            ('id', 'child_of', warehouse.lot_stock_id.id),
+            ('prestashop_synchronized', '=', True),
+            ('usage', '=', 'internal'),
+        ])
+        self.assertEqual(
+            template.with_context(location=locations.ids).qty_available,
+            template_binding.quantity,
+        )
+        self.assertEqual(8, template_binding.quantity)
+        for combination in combinations:
+            self.assertEqual(combination.odoo_id.qty_available,
+                             combination.quantity)
+        self.assertEqual([15, 3], combinations.mapped('quantity'))
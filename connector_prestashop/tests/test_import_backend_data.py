@@ -5,7 +5,8 @@
 from collections import namedtuple
 
 from .common import (
-    recorder, PrestashopTransactionCase, quiet_logger, assert_no_job_delayed
+    recorder, PrestashopTransactionCase, quiet_logger, assert_no_job_delayed,
+    read_many_one_by_one,
 )
 
 ExpectedShopGroup = namedtuple('ExpectedShopGroup',
@@ -62,7 +63,7 @@ class TestImportBackendData(PrestashopTransactionCase):
             'openerp.addons.connector_prestashop.unit.auto_matching_importer'
         )
         with quiet_logger('vcr'), quiet_logger('urllib3'):
-            with quiet_logger(auto_import_logger):
+            with quiet_logger(auto_import_logger), read_many_one_by_one():
                 self.backend_record.synchronize_basedata()
 
         langs = self.env['prestashop.res.lang'].search([])
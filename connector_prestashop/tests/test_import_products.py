@@ -16,7 +16,10 @@ from odoo.addons.connector_prestashop.models.\
         import_products
     )
 
-from .common import recorder, PrestashopTransactionCase, assert_no_job_delayed
+from .common import (
+    recorder, PrestashopTransactionCase, assert_no_job_delayed,
+    read_many_one_by_one,
+)
 
 
 ExpectedProductCategory = namedtuple(
@@ -46,14 +49,6 @@ class TestImportProduct(PrestashopTransactionCase):
         self.shop_group = self.env['prestashop.shop.group'].search([])
         self.shop = self.env['prestashop.shop'].search([])
 
-        self.mock_delay_import_image = mock.MagicMock()
-        self.patch_delay_import_image = mock.patch(
-            'openerp.addons.connector_prestashop.models.product_template'
-            '.importer.set_product_image_variant',
-            new=self.mock_delay_import_image
-        )
-        self.patch_delay_import_image.start()
-
         self.mock_delay_import_image = mock.MagicMock()
         self.patch_delay_import_image = mock.patch(
             'openerp.addons.connector_prestashop.models.product_template'
@@ -62,10 +57,10 @@ class TestImportProduct(PrestashopTransactionCase):
         )
         self.patch_delay_import_image.start()
 
+        # the supplier info and images of the combinations
         self.mock_delay_set_image = mock.MagicMock()
-        self.patch_delay_set_image = mock.patch(
-            'openerp.addons.connector_prestashop.models.product_template'
-            '.importer.set_product_image_variant',
+        self.patch_delay_set_image = mock.patch.object(
+            type(self.env['prestashop.product.template']), 'with_delay',
             new=self.mock_delay_set_image
         )
         self.patch_delay_set_image.start()
@@ -161,7 +156,8 @@ class TestImportProduct(PrestashopTransactionCase):
             )
             categs |= cat
 
-        with recorder.use_cassette('test_import_product_template_record_1'):
+        with recorder.use_cassette('test_import_product_template_record_1'), \
+                read_many_one_by_one():
             import_record(self.conn_session, 'prestashop.product.template',
                           self.backend_record.id, 1)
 
@@ -8,12 +8,15 @@ import mock
 
 from freezegun import freeze_time
 
+from odoo.addons.queue_job.exception import NothingToDoJob
 from odoo.addons.connector_prestashop.unit.importer import (
+    BatchImporter,
     import_record,
 )
 from odoo.addons.connector_prestashop.models.\
     sale_order.importer import (
-        import_orders_since
+        import_orders_since,
+        SaleImportRule,
     )
 
 from .common import recorder, PrestashopTransactionCase, assert_no_job_delayed
@@ -228,3 +231,60 @@ class TestImportSale(PrestashopTransactionCase):
         ]
 
         self.assert_records(expected, binding.order_line)
+
+
+class TestSaleImportRulePayments(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestSaleImportRulePayments, self).setUp()
+        env = self.backend_record.get_environment('prestashop.sale.order')
+        self.rule = env.get_connector_unit(SaleImportRule)
+
+    def test_prefetch_paid_amounts(self):
+        """ The payments of several orders are read at once and cached """
+        path = ('odoo.addons.connector_prestashop.unit.backend_adapter'
+                '.GenericAdapter.search_read')
+        with mock.patch(path) as search_read:
+            search_read.return_value = [
+                {'order_reference': 'AAA', 'amount': '10.00'},
+                {'order_reference': 'AAA', 'amount': '5.50'},
+            ]
+            self.rule.prefetch_paid_amounts([
+                {'reference': 'AAA'}, {'reference': 'BBB'},
+            ])
+            self.assertEqual(
+                15.5, self.rule._get_paid_amount({'reference': 'AAA'})
+            )
+            self.assertEqual(
+                0.0, self.rule._get_paid_amount({'reference': 'BBB'})
+            )
+        search_read.assert_called_once_with(
+            {'filter[order_reference]': '[AAA|BBB]'}
+        )
+
+    def test_chunk_dependencies_rejected_orders(self):
+        """ The dependencies of the orders rejected by the rules are not
+        imported with the chunk """
+        env = self.backend_record.get_environment('prestashop.sale.order')
+        importer = env.get_connector_unit(BatchImporter)
+        ps_key = self.backend_record.get_version_ps_key('order_row')
+        records = [
+            {'id': str(order_id), 'reference': 'REF%d' % order_id,
+             'id_customer': str(order_id), 'id_address_invoice': '1',
+             'id_address_delivery': '1', 'id_carrier': '1',
+             'associations': {'order_rows': {ps_key: []}}}
+            for order_id in (1, 2)
+        ]
+
+        def check(rule, record):
+            if record['id'] == '2':
+                raise NothingToDoJob('never imported')
+
+        with mock.patch.object(SaleImportRule, 'prefetch_paid_amounts'), \
+                mock.patch.object(SaleImportRule, 'check',
+                                  autospec=True) as rule_check, \
+                mock.patch.object(type(importer),
+                                  '_import_dependencies_many') as many:
+            rule_check.side_effect = check
+            importer._import_chunk_dependencies(records)
+        many.assert_any_call(set(['1']), 'prestashop.res.partner')
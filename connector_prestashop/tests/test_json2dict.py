@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+from odoo.tests import common
+
+from ..unit.json2dict import ASSOCIATION_KEYS, json2dict
+
+
+class TestJson2Dict(common.BaseCase):
+
+    def test_json2dict(self):
+        """ JSON records have the same structure as the XML ones """
+        record = {
+            'id': 1,
+            'price': '12.500000',
+            'type': 'simple',
+            'name': [{'id': '1', 'value': 'Shirt'},
+                     {'id': '2', 'value': 'Chemise'}],
+            'link_rewrite': [{'id': '1', 'value': 'shirt'}],
+            'associations': {
+                'categories': [{'id': '2'}, {'id': 3}],
+                'images': [{'id': '5'}],
+                'tags': [],
+            },
+        }
+        self.assertEqual(
+            {'id': u'1',
+             'price': '12.500000',
+             'type': {'attrs': {'notFilterable': 'true'}, 'value': 'simple'},
+             'name': {'language': [
+                 {'attrs': {'id': '1'}, 'value': 'Shirt'},
+                 {'attrs': {'id': '2'}, 'value': 'Chemise'},
+             ]},
+             'link_rewrite': {'language': {
+                 'attrs': {'id': '1'}, 'value': 'shirt'
+             }},
+             'associations': {
+                 'categories': {
+                     'attrs': {'nodeType': 'category', 'api': 'categories'},
+                     'category': [{'id': '2'}, {'id': u'3'}],
+                 },
+                 'images': {
+                     'attrs': {'nodeType': 'image', 'api': 'images'},
+                     'image': {'id': '5'},
+                 },
+                 'tags': {
+                     'attrs': {'nodeType': 'tag', 'api': 'tags'},
+                     'value': '',
+                 },
+             }},
+            json2dict(record, ASSOCIATION_KEYS.get,
+                      value_fields=('type',))
+        )
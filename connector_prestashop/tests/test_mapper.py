@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import mock
+
+from bs4 import BeautifulSoup
+
+from odoo.addons.connector.unit.mapper import ImportMapper
+
+from ..models.product_template.importer import TemplateMapper
+from ..unit.mapper import unique_name
+from .common import PrestashopTransactionCase
+
+
+class TestUniqueName(PrestashopTransactionCase):
+
+    def setUp(self):
+        super(TestUniqueName, self).setUp()
+        env = self.backend_record.get_environment(
+            'prestashop.product.template'
+        )
+        self.mapper = env.get_connector_unit(ImportMapper)
+        for code in ('ABC', 'ABC_1', 'ABC_3', 'AXB'):
+            self.env['product.template'].create({
+                'name': code,
+                'default_code': code,
+            })
+
+    def _unique_name(self, basename):
+        return unique_name(self.mapper, 'product.template', 'default_code',
+                           basename)
+
+    def test_first_free_suffix(self):
+        """ The first free suffix is used when the name is taken """
+        self.assertEqual('ABC_2', self._unique_name('ABC'))
+        self.assertEqual('NEW', self._unique_name('NEW'))
+
+    def test_like_wildcards(self):
+        """ The wildcards of the name are not interpreted """
+        self.assertEqual('A_B', self._unique_name('A_B'))
+
+    def test_reusable_names(self):
+        """ The names of the records returned by ``reusable`` are free """
+        name = unique_name(
+            self.mapper, 'product.template', 'default_code', 'ABC',
+            reusable=lambda templates: templates.filtered(
+                lambda template: template.default_code == 'ABC'),
+        )
+        self.assertEqual('ABC', name)
+
+    def test_name_locked(self):
+        """ A name being allocated by a concurrent job is skipped """
+        def try_lock(env, lock):
+            return not lock.endswith('ABC_2)')
+        with mock.patch('%s.pg_try_advisory_lock' % unique_name.__module__,
+                        side_effect=try_lock):
+            self.assertEqual('ABC_4', self._unique_name('ABC'))
+
+
+class TestHtmlCache(PrestashopTransactionCase):
+
+    def test_sanitize_prettified(self):
+        """ The sanitized HTML is the prettified HTML, with or without
+        xml:lang attribute """
+        for content in (u'<p>Shirt %s</p>' % self.id(),
+                        u'<p lang="fr" xml:lang="fr">Chemise</p>'):
+            expected = BeautifulSoup(
+                content.replace(u' xml:lang="fr"', u''), 'html.parser',
+            ).prettify()
+            self.assertEqual(expected, TemplateMapper.sanitize_html(content))
+
+    def test_sanitize_cached(self):
+        """ The same HTML is sanitized once """
+        content = u'<p lang="fr" xml:lang="fr">Chemise %s</p>' % self.id()
+        with mock.patch.object(TemplateMapper, '_remove_xml_lang') as parse:
+            parse.return_value = u'<p lang="fr">Chemise</p>'
+            TemplateMapper.sanitize_html(content)
+            result = TemplateMapper.sanitize_html(content)
+        self.assertEqual(u'<p lang="fr">Chemise</p>', result)
+        self.assertEqual(1, parse.call_count)
+
+    def test_sanitize_parse_count(self):
+        """ Importing many products sharing descriptions parses each
+        distinct description once """
+        contents = [u'<p lang="fr" xml:lang="fr">Chemise %s %d</p>' %
+                    (self.id(), index) for index in range(3)]
+        module = TemplateMapper.__module__
+        with mock.patch('%s.BeautifulSoup' % module,
+                        wraps=BeautifulSoup) as parse:
+            results = [TemplateMapper.sanitize_html(contents[index % 3])
+                       for index in range(100)]
+        self.assertEqual(3, parse.call_count)
+        self.assertEqual(
+            [BeautifulSoup(contents[index % 3].replace(u' xml:lang="fr"',
+                                                       u''),
+                           'html.parser').prettify()
+             for index in range(100)],
+            results,
+        )
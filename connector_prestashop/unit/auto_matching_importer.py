@@ -20,6 +20,43 @@ class AutoMatchingImporter(ConnectorUnit):
     def _compare_function(ps_val, erp_val, ps_dict, erp_dict):
         raise NotImplementedError
 
+    def _index_key(self, value):
+        """ Return the key of a value of ``_erp_field`` or ``_ps_field``
+
+        The Odoo records are indexed on this key and a PrestaShop record
+        is compared only with the Odoo records having the same key, so two
+        values which can match must have the same key.
+
+        When the key is None, the PrestaShop record is compared with all
+        the Odoo records, or the Odoo record with all the PrestaShop
+        records.
+        """
+        return None
+
+    def _candidate_keys(self, ps_val):
+        """ Keys of the Odoo records which can match a PrestaShop value """
+        return [self._index_key(ps_val)]
+
+    def _build_index(self, erp_list_dict):
+        index = {}
+        for position, erp_dict in enumerate(erp_list_dict):
+            key = self._index_key(erp_dict[self._erp_field])
+            index.setdefault(key, []).append((position, erp_dict))
+        return index
+
+    def _candidates(self, index, ps_val):
+        """ Odoo records to compare with a PrestaShop value, in the
+        order of the search """
+        keys = set(self._candidate_keys(ps_val))
+        if None in keys:
+            keys = index.keys()
+        else:
+            keys.add(None)
+        candidates = []
+        for key in keys:
+            candidates += index.get(key, [])
+        return [erp_dict for __, erp_dict in sorted(candidates)]
+
     def run(self):
         _logger.debug(
             "[%s] Starting synchro between Odoo and PrestaShop"
@@ -33,6 +70,7 @@ class AutoMatchingImporter(ConnectorUnit):
         model = self.env[erp_model_name].with_context(active_test=False)
         erp_ids = model.search([])
         erp_list_dict = erp_ids.read()
+        index = self._build_index(erp_list_dict)
         adapter = self.unit_for(BackendAdapter)
         # Get the IDS from PS
         ps_ids = adapter.search()
@@ -44,59 +82,59 @@ class AutoMatchingImporter(ConnectorUnit):
             )
 
         binder = self.binder_for()
-        # Loop on all PS IDs
-        for ps_id in ps_ids:
-            # Check if the PS ID is already mapped to an OE ID
-            record = binder.to_internal(ps_id)
-            if record:
-                # Do nothing for the PS IDs that are already mapped
-                _logger.debug(
-                    "[%s] PrestaShop ID %s is already mapped to Odoo ID %s"
-                    % (self.model._name, ps_id, record.id)
-                )
-                nr_ps_already_mapped += 1
-            else:
-                # PS IDs not mapped => I try to match between the PS ID and
-                # the OE ID. First, I read field in PS
-                ps_dict = adapter.read(ps_id)
-                mapping_found = False
-                # Loop on OE IDs
-                for erp_dict in erp_list_dict:
-                    # Search for a match
-                    erp_val = erp_dict[self._erp_field]
-                    ps_val = ps_dict[self._ps_field]
-                    if self._compare_function(
-                            ps_val, erp_val, ps_dict, erp_dict):
-                        # it matches, so I write the external ID
-                        data = {
-                            'odoo_id': erp_dict['id'],
-                            'backend_id': self.backend_record.id,
-                        }
-                        for oe_field, ps_field in self._copy_fields:
-                            data[oe_field] = erp_dict[ps_field]
-                        record = self.model.create(data)
-                        binder.bind(ps_id, record)
-                        _logger.debug(
-                            "[%s] Mapping PrestaShop '%s' (%s) "
-                            "to Odoo '%s' (%s) " %
-                            (self.model._name,
-                             ps_dict['name'],  # not hardcode if needed
-                             ps_dict[self._ps_field],
-                             erp_dict[erp_rec_name],
-                             erp_dict[self._erp_field]))
-                        nr_ps_mapped += 1
-                        mapping_found = True
-                        break
-                if not mapping_found:
-                    # if it doesn't match, I just print a warning
-                    _logger.warning(
-                        "[%s] PrestaShop '%s' (%s) was not mapped "
-                        "to any Odoo entry" %
+        # Check at once which PS IDs are already mapped to an OE ID
+        bindings = binder.to_internal_many(ps_ids)
+        for ps_id, record in bindings.iteritems():
+            # Do nothing for the PS IDs that are already mapped
+            _logger.debug(
+                "[%s] PrestaShop ID %s is already mapped to Odoo ID %s"
+                % (self.model._name, ps_id, record.id)
+            )
+        nr_ps_already_mapped = len(bindings)
+        # PS IDs not mapped => I try to match between the PS ID and
+        # the OE ID. First, I read them in PS
+        ps_records = adapter.read_many(
+            [ps_id for ps_id in ps_ids if int(ps_id) not in bindings]
+        )
+        for ps_id in sorted(ps_records):
+            ps_dict = ps_records[ps_id]
+            ps_val = ps_dict[self._ps_field]
+            mapping_found = False
+            # Loop on the OE IDs which can match
+            for erp_dict in self._candidates(index, ps_val):
+                erp_val = erp_dict[self._erp_field]
+                if self._compare_function(
+                        ps_val, erp_val, ps_dict, erp_dict):
+                    # it matches, so I write the external ID
+                    data = {
+                        'odoo_id': erp_dict['id'],
+                        'backend_id': self.backend_record.id,
+                    }
+                    for oe_field, ps_field in self._copy_fields:
+                        data[oe_field] = erp_dict[ps_field]
+                    record = self.model.create(data)
+                    binder.bind(ps_id, record)
+                    _logger.debug(
+                        "[%s] Mapping PrestaShop '%s' (%s) "
+                        "to Odoo '%s' (%s) " %
                         (self.model._name,
-                         ps_dict['name'],
-                         ps_dict[self._ps_field]))
+                         ps_dict['name'],  # not hardcode if needed
+                         ps_dict[self._ps_field],
+                         erp_dict[erp_rec_name],
+                         erp_dict[self._erp_field]))
+                    nr_ps_mapped += 1
+                    mapping_found = True
+                    break
+            if not mapping_found:
+                # if it doesn't match, I just print a warning
+                _logger.warning(
+                    "[%s] PrestaShop '%s' (%s) was not mapped "
+                    "to any Odoo entry" %
+                    (self.model._name,
+                     ps_dict['name'],
+                     ps_dict[self._ps_field]))
 
-                    nr_ps_not_mapped += 1
+                nr_ps_not_mapped += 1
 
         _logger.info(
             "[%s] Synchro between Odoo and PrestaShop successfull"
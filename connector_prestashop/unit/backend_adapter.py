@@ -6,15 +6,28 @@ from odoo.addons.connector.exception import NetworkRetryableError
 from odoo.addons.connector.unit.backend_adapter import CRUDAdapter
 
 from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError, RequestException, ConnectionError
 import base64
+import copy
 import logging
+import threading
+import time
+import requests
+from xml.etree import cElementTree as ElementTree
+from .cache import job_cache
+from .json2dict import ASSOCIATION_KEYS, json2dict
 _logger = logging.getLogger(__name__)
 try:
     from prestapyt import PrestaShopWebServiceDict, PrestaShopWebServiceError
+    from prestapyt.xml2dict import ET2dict
 except:
     _logger.debug('Cannot import from `prestapyt`')
 
+# default values used when the backend does not define them
+DEFAULT_POOL_SIZE = 4
+DEFAULT_POOL_IDLE_TIMEOUT = 300  # seconds
+
 
 @contextmanager
 def api_handle_errors(message=''):
@@ -97,6 +110,97 @@ class PrestaShopLocation(object):
         self.api_url = location
 
 
+class PrestaShopClientPool(object):
+    """ Pool of PrestaShop webservice clients, shared in the process
+
+    A client is kept per database, backend and location. All the clients
+    use a ``requests`` session with keep-alive connections, so the
+    adapters instantiated during a job (and the next jobs of the same
+    worker) reuse the connections instead of doing a new TCP and TLS
+    handshake each time.
+
+    Clients which have not been used for longer than their idle timeout
+    are closed and dropped from the pool.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _new_session(self, webservice_key, pool_size):
+        session = requests.Session()
+        session.auth = (webservice_key, '')
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _close_idle(self, now):
+        for key, entry in self._clients.items():
+            if now - entry['last_used'] > entry['idle_timeout']:
+                del self._clients[key]
+                entry['session'].close()
+
+    def get(self, key, api_url, webservice_key, client_class=None,
+            pool_size=None, idle_timeout=None):
+        """ Return a client for ``key``, create it if necessary
+
+        :param key: hashable identifying the client (database, backend, ...)
+        :param api_url: URL of the webservice
+        :param webservice_key: key of the webservice
+        :param client_class: class of the client,
+                             ``PrestaShopWebServiceDict`` by default
+        :param pool_size: maximum number of connections kept open
+        :param idle_timeout: seconds after which an unused client is closed
+        """
+        if client_class is None:
+            client_class = PrestaShopWebServiceDict
+        pool_size = pool_size or DEFAULT_POOL_SIZE
+        idle_timeout = idle_timeout or DEFAULT_POOL_IDLE_TIMEOUT
+        key = (key, api_url, webservice_key, client_class, pool_size)
+        now = time.time()
+        with self._lock:
+            self._close_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry['last_used'] = now
+                return entry['client']
+            self.misses += 1
+            session = self._new_session(webservice_key, pool_size)
+            client = client_class(api_url, webservice_key, session=session)
+            self._clients[key] = {
+                'client': client,
+                'session': session,
+                'last_used': now,
+                'idle_timeout': idle_timeout,
+            }
+        _logger.debug('new PrestaShop client for %s (pool hits: %d, '
+                      'misses: %d)', api_url, self.hits, self.misses)
+        return client
+
+    def stats(self):
+        """ Return the counters of the pool """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'clients': len(self._clients),
+        }
+
+    def clear(self):
+        """ Close and drop all the clients """
+        with self._lock:
+            for entry in self._clients.itervalues():
+                entry['session'].close()
+            self._clients.clear()
+
+
+client_pool = PrestaShopClientPool()
+
+
 class PrestaShopCRUDAdapter(CRUDAdapter):
     """ External Records Adapter for PrestaShop """
 
@@ -111,9 +215,24 @@ class PrestaShopCRUDAdapter(CRUDAdapter):
             self.backend_record.location.encode(),
             self.backend_record.webservice_key
         )
-        self.client = PrestaShopWebServiceDict(
-            self.prestashop.api_url,
+        self.client = self.get_client()
+
+    def get_client(self, api_url=None, client_class=None):
+        """ Return a pooled client for the backend
+
+        :param api_url: URL of the webservice, by default the one of the
+                        backend (can be the one of a shop)
+        :param client_class: class of the client,
+                             ``PrestaShopWebServiceDict`` by default
+        """
+        backend = self.backend_record
+        return client_pool.get(
+            (self.env.cr.dbname, backend.id),
+            api_url or self.prestashop.api_url,
             self.prestashop.webservice_key,
+            client_class=client_class,
+            pool_size=backend.http_pool_size,
+            idle_timeout=backend.http_pool_idle_timeout,
         )
 
     def search(self, filters=None):
@@ -161,6 +280,56 @@ class GenericAdapter(PrestaShopCRUDAdapter):
     # _export_node_name="manufacturers"
     # _export_node_name_res = "manufacturer"
     _export_node_name_res = ''
+    # maximum number of ids sent in a single ``read_many`` request
+    _read_many_chunk_size = 100
+    # number of records kept by ``read`` for the duration of the job
+    _read_cache_size = 500
+    # read the records in JSON when the backend is configured so,
+    # set to False for the resources whose JSON output is wrong
+    _json_supported = True
+    # fields which have attributes in the XML output, xml2dict returns them
+    # as {'attrs': {...}, 'value': ...}
+    _json_value_fields = ()
+
+    def _use_json(self):
+        return (self._json_supported and
+                self.backend_record.output_format == 'json')
+
+    def _get_json(self, resource_id=None, options=None):
+        """ GET the resource with ``output_format=JSON``
+
+        :return: list of the records in the same structure as the XML
+                 output, or None if the response could not be decoded
+        """
+        url = self.client._api_url + self._prestashop_model
+        if resource_id is not None:
+            url += '/%s' % (resource_id,)
+        options = dict(options or {}, output_format='JSON')
+        url += '?%s' % (self.client._options_to_querystring(options),)
+        response = self.client._execute(url, 'GET')
+        try:
+            content = response.json()
+        except ValueError:
+            _logger.warning('Invalid JSON response for %s, '
+                            'reading it in XML', url)
+            return None
+        if not content:
+            # no records
+            return []
+        records = content.values()[0]
+        if isinstance(records, dict):
+            records = [records]
+        node_keys = {}
+
+        def node_key(association):
+            if association not in node_keys:
+                key = ASSOCIATION_KEYS.get(association, association[:-1])
+                node_keys[association] = \
+                    self.backend_record.get_version_ps_key(key)
+            return node_keys[association]
+
+        return [json2dict(record, node_key, self._json_value_fields)
+                for record in records]
 
     def search(self, filters=None):
         """ Search records according to some criterias
@@ -171,20 +340,180 @@ class GenericAdapter(PrestaShopCRUDAdapter):
         _logger.debug(
             'method search, model %s, filters %s',
             self._prestashop_model, unicode(filters))
+        if self._use_json():
+            records = self._get_json(options=filters)
+            if records is not None:
+                return [int(record['id']) for record in records]
         return self.client.search(self._prestashop_model, filters)
 
+    def _read_cache(self):
+        return job_cache(self.env, 'adapter_read',
+                         maxsize=self._read_cache_size, transactional=False)
+
+    def _read_cache_key(self, id, attributes=None):
+        return (self.backend_record.id, self._prestashop_model, int(id),
+                tuple(sorted((attributes or {}).items())))
+
+    def _invalidate_read_cache(self, ids):
+        cache = self._read_cache()
+        for key in cache.keys():
+            if key[1] == self._prestashop_model and key[2] in ids:
+                cache.pop(key)
+
     def read(self, id, attributes=None):
         """ Returns the information of a record
 
+        The records read are kept in a cache for the duration of the job,
+        so reading the same record again does not call PrestaShop. The
+        records served from the cache are copies.
+
         :rtype: dict
         """
+        cache = self._read_cache()
+        key = self._read_cache_key(id, attributes)
+        record = cache.get(key)
+        if record is not None:
+            _logger.debug(
+                'method read, model %s id %s, attributes %s served from the '
+                'cache (%d reads avoided in the job)',
+                self._prestashop_model, str(id), unicode(attributes),
+                cache.hits)
+            return copy.deepcopy(record)
+        record = self._read(id, attributes=attributes)
+        cache.set(key, record)
+        return record
+
+    def _read(self, id, attributes=None):
         _logger.debug(
             'method read, model %s id %s, attributes %s',
             self._prestashop_model, str(id), unicode(attributes))
+        if self._use_json():
+            records = self._get_json(id, options=attributes)
+            if records:
+                return records[0]
         res = self.client.get(self._prestashop_model, id, options=attributes)
         first_key = res.keys()[0]
         return res[first_key]
 
+    def read_many(self, ids, attributes=None):
+        """ Returns the information of several records
+
+        The records are fetched with ``display=full`` and a filter on the
+        ids, ``_read_many_chunk_size`` records per request.
+
+        :param ids: list of PrestaShop ids
+        :param attributes: additional options for the request
+        :return: the records indexed by their (integer) id, the ids which
+                 do not exist anymore are missing
+        :rtype: dict
+        """
+        ids = [int(id_) for id_ in ids]
+        records = {}
+        for index in range(0, len(ids), self._read_many_chunk_size):
+            chunk = ids[index:index + self._read_many_chunk_size]
+            options = dict(attributes or {})
+            options['filter[id]'] = '[%s]' % '|'.join(
+                str(id_) for id_ in chunk
+            )
+            for record in self.search_read(options):
+                records[int(record['id'])] = record
+        if not attributes:
+            self.cache_records(records.values())
+        return records
+
+    def cache_records(self, records):
+        """ Keep records read with ``display=full`` for ``read``, they are
+        the same as the ones it returns """
+        cache = self._read_cache()
+        for record in records:
+            cache.set(self._read_cache_key(record['id']), record)
+
+    def search_read(self, filters=None):
+        """ Search records and returns their information at once
+
+        :param filters: options of the request, ``display=full`` is used
+                        when no ``display`` is given
+        :rtype: list of dict
+        """
+        options = dict(filters or {})
+        options.setdefault('display', 'full')
+        _logger.debug(
+            'method search_read, model %s, filters %s',
+            self._prestashop_model, unicode(options))
+        records = None
+        if self._use_json():
+            records = self._get_json(options=options)
+        if records is None:
+            res = self.client.get(self._prestashop_model, options=options)
+            records = self._records_from_response(res)
+        return records
+
+    def iter_search_read(self, filters=None, client=None):
+        """ Search records and yield their information one by one
+
+        The response is streamed and parsed incrementally: a record is
+        converted to a dict when its element is complete, then removed
+        from the tree, so the memory used does not depend on the number
+        of records in the response.
+
+        :param filters: options of the request, ``display=full`` is used
+                        when no ``display`` is given
+        :param client: client to use, the one of the adapter by default
+        :rtype: generator of dict
+        """
+        if client is None:
+            client = self.client
+        options = dict(filters or {})
+        options.setdefault('display', 'full')
+        _logger.debug(
+            'method iter_search_read, model %s, filters %s',
+            self._prestashop_model, unicode(options))
+        client._validate_query_options(options)
+        url = '%s%s?%s' % (client._api_url,
+                           self._prestashop_model,
+                           client._options_to_querystring(options))
+        response = client.client.get(url, stream=True)
+        try:
+            if response.status_code not in (200, 201):
+                client._check_status_code(response.status_code,
+                                          response.content)
+            response.raw.decode_content = True
+            # <prestashop><products><product>...</product>...
+            depth = 0
+            container = None
+            for event, elem in ElementTree.iterparse(
+                    response.raw, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 2:
+                        container = elem
+                    continue
+                depth -= 1
+                if depth == 2:
+                    yield ET2dict(elem)[elem.tag]
+                    container.remove(elem)
+        finally:
+            response.close()
+
+    @staticmethod
+    def _records_from_response(response):
+        """ Extract the records from a list response
+
+        The webservice returns an empty node when nothing matches, the
+        record itself when there is only one and a list otherwise.
+
+        :rtype: list
+        """
+        if not response:
+            return []
+        node = response.values()[0]
+        if not node:
+            return []
+        records = node.values()[0]
+        if isinstance(records, dict):
+            return [records]
+        return records
+
     def create(self, attributes=None):
         """ Create a record on the external system """
         _logger.debug(
@@ -200,6 +529,7 @@ class GenericAdapter(PrestaShopCRUDAdapter):
     def write(self, id, attributes=None):
         """ Update records on the external system """
         attributes['id'] = id
+        self._invalidate_read_cache([int(id)])
         _logger.debug(
             'method write, model %s, attributes %s',
             self._prestashop_model,
@@ -215,6 +545,9 @@ class GenericAdapter(PrestaShopCRUDAdapter):
         _logger.debug('method delete, model %s, ids %s',
                       resource, unicode(ids))
         # Delete a record(s) on the external system
+        if resource == self._prestashop_model:
+            ids_ = ids if isinstance(ids, (list, tuple)) else [ids]
+            self._invalidate_read_cache([int(id_) for id_ in ids_])
         return self.client.delete(resource, ids)
 
     def head(self, id=None):
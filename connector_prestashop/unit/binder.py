@@ -3,9 +3,33 @@
 
 from odoo.addons.connector.connector import Binder
 from ..backend import prestashop
+from .cache import job_cache
 from odoo import models
 
 
+def _cache_key(model_name, backend_id, direction, value):
+    return (model_name, backend_id, direction, unicode(value))
+
+
+def invalidate_bindings(bindings):
+    """ Drop the cached lookups of bindings
+
+    Called when the bindings are deleted with their ``unlink()``. The
+    bindings deleted by the database, in cascade of the deletion of their
+    Odoo record, do not go through it: the binder checks that the bindings
+    found in the cache still exist before returning them.
+    """
+    cache = job_cache(bindings.env, 'binder',
+                      maxsize=PrestashopBinder._cache_size)
+    for binding in bindings:
+        backend_id = binding.backend_id.id
+        cache.pop(_cache_key(binding._name, backend_id, 'internal',
+                             binding.prestashop_id))
+        if 'odoo_id' in binding._fields:
+            cache.pop(_cache_key(binding._name, backend_id, 'external',
+                                 binding.odoo_id.id))
+
+
 @prestashop
 class PrestashopBinder(Binder):
     """ Generic Binder for Prestashop """
@@ -40,6 +64,138 @@ class PrestashopBinder(Binder):
         'prestashop.groups.pricelist',
     ]
 
+    # number of bindings kept in the cache of the job
+    _cache_size = 10000
+
+    def _cache(self):
+        return job_cache(self.env, 'binder', maxsize=self._cache_size)
+
+    def _cache_key(self, direction, value):
+        return _cache_key(self.model._name, self.backend_record.id,
+                          direction, value)
+
+    def _unwrap(self, bindings, unwrap):
+        if unwrap:
+            return bindings[self._openerp_field]
+        return bindings
+
+    def to_internal(self, external_id, unwrap=False):
+        """ Give the Odoo recordset for an external ID
+
+        The bindings found are kept in a cache for the duration of the job,
+        it is invalidated by :meth:`bind` and by the deletion of bindings,
+        see :func:`invalidate_bindings`.
+        """
+        cache = self._cache()
+        key = self._cache_key('internal', external_id)
+        binding_id = cache.get(key)
+        if binding_id is not None:
+            binding = self.model.with_context(active_test=False).browse(
+                binding_id
+            ).exists()
+            if binding:
+                return self._unwrap(binding, unwrap)
+            # deleted meanwhile, e.g. in cascade of its Odoo record
+            cache.pop(key)
+        binding = super(PrestashopBinder, self).to_internal(external_id)
+        if binding:
+            cache.set(key, binding.id)
+        return self._unwrap(binding, unwrap)
+
+    def to_internal_many(self, external_ids, unwrap=False):
+        """ Give the Odoo records for a list of external IDs
+
+        The bindings are searched at once.
+
+        :return: dict with the (integer) external IDs as keys and the
+                 bindings (or the Odoo records if ``unwrap``) as values,
+                 the external IDs which are not bound are missing
+        """
+        cache = self._cache()
+        model = self.model.with_context(active_test=False)
+        cached = {}
+        missing = set()
+        for external_id in external_ids:
+            binding_id = cache.get(self._cache_key('internal', external_id))
+            if binding_id is None:
+                missing.add(int(external_id))
+            else:
+                cached[int(external_id)] = binding_id
+        # the cached bindings may have been deleted meanwhile, e.g. in
+        # cascade of their Odoo record
+        existing = set(model.browse(cached.values()).exists().ids)
+        result = {}
+        for external_id, binding_id in cached.iteritems():
+            if binding_id in existing:
+                result[external_id] = model.browse(binding_id)
+            else:
+                cache.pop(self._cache_key('internal', external_id))
+                missing.add(external_id)
+        if missing:
+            bindings = model.search([
+                (self._external_field, 'in', list(missing)),
+                (self._backend_field, '=', self.backend_record.id),
+            ])
+            for binding in bindings:
+                external_id = binding[self._external_field]
+                cache.set(self._cache_key('internal', external_id),
+                          binding.id)
+                result[external_id] = binding
+        if unwrap:
+            return dict((external_id, binding[self._openerp_field])
+                        for external_id, binding in result.iteritems())
+        return result
+
+    def to_external(self, binding, wrap=False):
+        """ Give the external ID for an Odoo binding ID
+
+        When ``wrap`` is True, the binding found for the Odoo record is
+        kept in the cache of the job.
+        """
+        if not wrap:
+            return super(PrestashopBinder, self).to_external(binding)
+        if isinstance(binding, models.BaseModel):
+            binding.ensure_one()
+            binding = binding.id
+        model = self.model.with_context(active_test=False)
+        cache = self._cache()
+        key = self._cache_key('external', binding)
+        binding_id = cache.get(key)
+        record = model.browse()
+        if binding_id is not None:
+            # deleted meanwhile when it does not exist anymore
+            record = model.browse(binding_id).exists()
+        if not record:
+            record = model.search([
+                (self._openerp_field, '=', binding),
+                (self._backend_field, '=', self.backend_record.id),
+            ])
+            if not record:
+                cache.pop(key)
+                return None
+            record.ensure_one()
+            cache.set(key, record.id)
+        return record[self._external_field]
+
+    def bind(self, external_id, binding):
+        """ Create the link between an external ID and an Odoo ID, the
+        previous cached lookups of both are replaced """
+        if not isinstance(binding, models.BaseModel):
+            binding = self.model.browse(binding)
+        cache = self._cache()
+        cache.pop(self._cache_key('internal', external_id))
+        for record in binding:
+            if record[self._external_field]:
+                cache.pop(self._cache_key('internal',
+                                          record[self._external_field]))
+            if self._openerp_field in record._fields:
+                cache.pop(self._cache_key('external',
+                                          record[self._openerp_field].id))
+        res = super(PrestashopBinder, self).bind(external_id, binding)
+        if len(binding) == 1:
+            cache.set(self._cache_key('internal', external_id), binding.id)
+        return res
+
     def to_odoo(self, external_id, unwrap=False):
         # Make alias to to_openerp, remove in v10
         return self.to_openerp(external_id, unwrap)
@@ -59,15 +215,7 @@ class PrestashopBinder(Binder):
             record = binding_id
             binding_id = binding_id.id
         if wrap:
-            binding = self.model.with_context(active_test=False).search(
-                [(self._openerp_field, '=', binding_id),
-                 (self._backend_field, '=', self.backend_record.id),
-                 ]
-            )
-            if not binding:
-                return None
-            binding.ensure_one()
-            return getattr(binding, self._external_field)
+            return self.to_external(binding_id, wrap=True)
         if not record:
             record = self.model.browse(binding_id)
         assert record
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """ Mapping which keeps at most ``maxsize`` keys
+
+    When the cache is full, the least recently used key is dropped.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.transactional = True
+        self._data = OrderedDict()
+        # number of lookups which found, or not, their key
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data[key] = value
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def keys(self):
+        return list(self._data)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+
+# caches per database cursor, they disappear with the cursor
+_job_caches = weakref.WeakKeyDictionary()
+_job_caches_lock = threading.Lock()
+
+
+def job_cache(env, name, maxsize=1000, transactional=True):
+    """ Return the cache ``name`` of the cursor of ``env``
+
+    A job is executed with its own cursor, so the cache lives as long as
+    the job. Data committed by other transactions meanwhile is not seen,
+    which is what we want within a job.
+
+    :param env: Odoo environment
+    :param name: name of the cache
+    :param maxsize: maximum number of keys in the cache
+    :param transactional: False when the cache does not contain data of
+                          the database (but data read from PrestaShop for
+                          instance), so it is kept by
+                          :func:`clear_job_caches`
+    :rtype: :class:`LRUCache`
+    """
+    with _job_caches_lock:
+        caches = _job_caches.setdefault(env.cr, {})
+        cache = caches.get(name)
+        if cache is None:
+            cache = caches[name] = LRUCache(maxsize)
+            cache.transactional = transactional
+    return cache
+
+
+def clear_job_caches(env):
+    """ Drop the transactional caches of the cursor of ``env``
+
+    Must be called when the transaction is rolled back (to a savepoint for
+    instance), as the caches may contain data which does not exist
+    anymore.
+    """
+    with _job_caches_lock:
+        caches = _job_caches.get(env.cr, {})
+        for name, cache in caches.items():
+            if cache.transactional:
+                del caches[name]
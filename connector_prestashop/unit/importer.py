@@ -2,10 +2,13 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
 import logging
+import threading
+from collections import Mapping
 from contextlib import closing, contextmanager
 
 import odoo
-from odoo import _
+from odoo import _, fields
+from odoo.tools import split_every
 
 from odoo.addons.queue_job.job import job
 from odoo.addons.connector.unit.synchronizer import Importer
@@ -14,7 +17,10 @@ from odoo.addons.connector.connector import ConnectorEnvironment
 from odoo.addons.queue_job.exception import (
     RetryableJobError,
     FailedJobError,
+    NothingToDoJob,
 )
+from .backend_adapter import GenericAdapter
+from .cache import clear_job_caches
 
 
 _logger = logging.getLogger(__name__)
@@ -57,9 +63,63 @@ class PrestashopBaseImporter(Importer):
             importer = self.unit_for(importer_class, model=binding_model)
             importer.run(prestashop_id, **kwargs)
 
+    def _import_dependencies_many(self, prestashop_ids, binding_model,
+                                  importer_class=None, prestashop_records=None,
+                                  **kwargs):
+        """ Import the records of a dependency which are not imported yet
+
+        The bindings are searched and the missing records are read at
+        once. Each missing record is then imported in a savepoint: when
+        it fails, the error is only logged, the import of the record
+        depending on it will try it again with ``_import_dependency``.
+
+        :param prestashop_ids: ids of the prestashop records to import
+        :param binding_model: name of the binding model for the relation
+        :param importer_class: see ``_import_dependency``
+        :param prestashop_records: records already read, by (integer) id,
+                                   the other missing records are read
+        :param kwargs: additional keyword arguments are passed to the importer
+        """
+        external_ids = set(int(prestashop_id)
+                           for prestashop_id in prestashop_ids
+                           if prestashop_id and int(prestashop_id))
+        if not external_ids:
+            return
+        if importer_class is None:
+            importer_class = PrestashopImporter
+        binder = self.binder_for(binding_model)
+        missing = external_ids - set(binder.to_internal_many(external_ids))
+        if not missing:
+            return
+        records = dict(prestashop_records or {})
+        to_read = missing - set(records)
+        if to_read:
+            adapter = self.unit_for(GenericAdapter, model=binding_model)
+            records.update(adapter.read_many(sorted(to_read)))
+        for prestashop_id in sorted(missing):
+            importer = self.unit_for(importer_class, model=binding_model)
+            try:
+                with self.env.cr.savepoint():
+                    importer.run(prestashop_id,
+                                 prestashop_record=records.get(prestashop_id),
+                                 **kwargs)
+            except RetryableJobError:
+                raise
+            except NothingToDoJob:
+                continue
+            except Exception:
+                _logger.info('Import of the dependency %s %s failed, it will '
+                             'be imported with the record depending on it',
+                             binding_model, prestashop_id, exc_info=True)
+                self.env.invalidate_all()
+                clear_job_caches(self.env)
+
 
 class PrestashopImporter(PrestashopBaseImporter):
     """ Base importer for PrestaShop """
+    # skip the records which have not been modified on PrestaShop since
+    # their last import, see ``_is_uptodate``
+    _skip_unchanged = True
 
     def __init__(self, environment):
         """
@@ -69,6 +129,7 @@ class PrestashopImporter(PrestashopBaseImporter):
         super(PrestashopImporter, self).__init__(environment)
         self.prestashop_id = None
         self.prestashop_record = None
+        self.force = False
 
     def _get_prestashop_data(self):
         """ Return the raw prestashop data for ``self.prestashop_id`` """
@@ -76,6 +137,27 @@ class PrestashopImporter(PrestashopBaseImporter):
 
     def _has_to_skip(self):
         """ Return True if the import can be skipped """
+        return self._is_uptodate(self._get_binding())
+
+    def _is_uptodate(self, binding):
+        """ Return a message if the binding is already up-to-date
+
+        The ``date_upd`` of the PrestaShop record is compared with the one
+        stored on the binding during the previous import. Records without
+        update date (or with the ``0000-00-00`` date) are always imported.
+        """
+        if not binding or not self._skip_unchanged or self.force:
+            return False
+        if 'date_upd' not in binding._fields or not binding.date_upd:
+            return False
+        ps_date = self.prestashop_record.get('date_upd')
+        if not ps_date or ps_date.startswith('0000-00-00'):
+            return False
+        ps_date = fields.Datetime.from_string(ps_date)
+        if ps_date <= fields.Datetime.from_string(binding.date_upd):
+            return _('Already up-to-date (not modified since %s).') % (
+                binding.date_upd,
+            )
         return False
 
     def _import_dependencies(self):
@@ -224,21 +306,46 @@ class PrestashopImporter(PrestashopBaseImporter):
                     ignore_retry=True
                 )
 
-    def run(self, prestashop_id, **kwargs):
-        """ Run the synchronization
+    def _check_many_in_new_connector_env(self, prestashop_ids):
+        """ Same as ``_check_in_new_connector_env`` for several records,
+        in one transaction """
+        with self.do_in_new_connector_env() as new_connector_env:
+            binder = new_connector_env.get_connector_unit(Binder)
+            if binder.to_internal_many(prestashop_ids):
+                raise RetryableJobError(
+                    'Concurrent error. The job will be retried later',
+                    seconds=RETRY_WHEN_CONCURRENT_DETECTED,
+                    ignore_retry=True
+                )
 
-        :param prestashop_id: identifier of the record on PrestaShop
-        """
-        self.prestashop_id = prestashop_id
+    def _lock_import(self, prestashop_id):
+        """ Keep a lock on the import of the record until the transaction
+        is committed """
         lock_name = 'import({}, {}, {}, {})'.format(
             self.backend_record._name,
             self.backend_record.id,
             self.model._name,
-            self.prestashop_id,
+            prestashop_id,
         )
-        # Keep a lock on this import until the transaction is committed
         self.advisory_lock_or_retry(lock_name,
                                     retry_seconds=RETRY_ON_ADVISORY_LOCK)
+
+    def run(self, prestashop_id, prestashop_record=None, force=False,
+            **kwargs):
+        """ Run the synchronization
+
+        :param prestashop_id: identifier of the record on PrestaShop
+        :param prestashop_record: data of the record when it has already
+                                  been read (e.g. with ``read_many``), it
+                                  is read from PrestaShop otherwise
+        :param force: import the record even if it has not been modified
+                      on PrestaShop since its last import
+        """
+        self.prestashop_id = prestashop_id
+        self.force = force
+        if prestashop_record:
+            self.prestashop_record = prestashop_record
+        self._lock_import(self.prestashop_id)
         if not self.prestashop_record:
             self.prestashop_record = self._get_prestashop_data()
 
@@ -283,12 +390,15 @@ class PrestashopImporter(PrestashopBaseImporter):
         self._after_import(binding)
 
 
-class BatchImporter(Importer):
+class BatchImporter(PrestashopBaseImporter):
     """ The role of a BatchImporter is to search for a list of
     items to import, then it can either import them directly or delay
     the import of each item separately.
     """
     page_size = 1000
+    # paginate on the ids (``filter[id]=>[last id]``) rather than with an
+    # offset, see ``_run_keyset``
+    keyset_pagination = False
 
     def run(self, filters=None, **kwargs):
         """ Run the synchronization """
@@ -297,6 +407,9 @@ class BatchImporter(Importer):
         if 'limit' in filters:
             self._run_page(filters, **kwargs)
             return
+        if self.keyset_pagination and 'filter[id]' not in filters:
+            self._run_keyset(filters, **kwargs)
+            return
         page_number = 0
         filters['limit'] = '%d,%d' % (
             page_number * self.page_size, self.page_size)
@@ -307,6 +420,34 @@ class BatchImporter(Importer):
                 page_number * self.page_size, self.page_size)
             record_ids = self._run_page(filters, **kwargs)
 
+    def _run_keyset(self, filters, **kwargs):
+        """ Run the synchronization page by page, sorted by id
+
+        Each page starts after the last id of the previous one, so
+        PrestaShop does not have to scan a growing offset and the records
+        created meanwhile do not shift the pages.
+
+        The last id is stored in a ``prestashop.import.cursor`` committed
+        with the page, so when the batch import is interrupted, it
+        restarts after the last imported page instead of the first one.
+        """
+        cursor = self.env['prestashop.import.cursor'].get_cursor(
+            self.backend_record, self.model._name, filters
+        )
+        filters = dict(filters, sort='[id_ASC]', limit=str(self.page_size))
+        while True:
+            if cursor.last_id:
+                filters['filter[id]'] = '>[%d]' % cursor.last_id
+            record_ids = self._run_page(filters, **kwargs)
+            if len(record_ids) < self.page_size:
+                break
+            cursor.last_id = max(int(record_id) for record_id in record_ids)
+            if not getattr(threading.currentThread(), 'testing', False):
+                # Commit the jobs of the page along with the cursor, so
+                # a failure on the next pages does not lose them.
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+        cursor.unlink()
+
     def _run_page(self, filters, **kwargs):
         record_ids = self.backend_adapter.search(filters)
 
@@ -343,24 +484,137 @@ class DirectBatchImporter(BatchImporter):
     """
     _model_name = None
 
-    def _import_record(self, record):
+    def _import_record(self, record, **kwargs):
         """ Import the record directly """
-        self.env[self.model._name].with_delay().import_record(
-            backend=self.backend_record,
-            prestashop_id=record)
+        importer = self.unit_for(PrestashopImporter)
+        importer.run(record, **kwargs)
 
 
 class DelayedBatchImporter(BatchImporter):
     """ Delay import of the records """
     _model_name = None
+    # when set, delay one job per chunk of ``chunk_size`` records instead
+    # of one job per record
+    chunk_size = None
 
-    def _import_record(self, record, **kwargs):
+    def _run_page(self, filters, **kwargs):
+        if not self.chunk_size:
+            return super(DelayedBatchImporter, self)._run_page(
+                filters, **kwargs
+            )
+        record_ids = self.backend_adapter.search(filters)
+        for chunk in split_every(self.chunk_size, record_ids, list):
+            self.env[self.model._name].with_delay().import_records(
+                backend=self.backend_record,
+                prestashop_ids=chunk,
+                **kwargs)
+        return record_ids
+
+    def _import_record(self, record, eta=None, **kwargs):
         """ Delay the import of the records"""
-        self.env[self.model._name].with_delay().import_record(
+        self.env[self.model._name].with_delay(eta=eta).import_record(
             backend=self.backend_record,
             prestashop_id=record,
             **kwargs)
 
+    def _import_chunk_dependencies(self, records):
+        """ Import the dependencies of a chunk of records at once, before
+        the records, see ``_import_dependencies_many`` """
+        return
+
+    def import_chunk(self, record_ids, **kwargs):
+        """ Import a chunk of records in the current job
+
+        The records are read at once, then each one is imported in a
+        savepoint. The records which fail are delayed in their own job,
+        so they are retried or reported separately.
+
+        :return: summary of the import
+        """
+        records = self.backend_adapter.read_many(record_ids)
+        return self._import_chunk_records(record_ids, records, **kwargs)
+
+    def _import_chunk_records(self, record_ids, records, **kwargs):
+        """ Import records already read, see ``import_chunk``
+
+        :param record_ids: ids of the records to import, in order
+        :param records: records read from PrestaShop by (integer) id
+        :return: summary of the import
+        """
+        self._import_chunk_dependencies(records.values())
+        imported = []
+        skipped = []
+        failed = []
+        postponed = []
+        for record_id in record_ids:
+            importer = self.unit_for(PrestashopImporter)
+            try:
+                with self.env.cr.savepoint():
+                    skip = importer.run(
+                        record_id,
+                        prestashop_record=records.get(int(record_id)),
+                        **kwargs
+                    )
+            except NothingToDoJob as err:
+                skip = err
+            except RetryableJobError as err:
+                if not err.seconds:
+                    raise
+                # retry it alone, not before the delay asked by the error
+                _logger.info('Import of %s %s postponed: %s',
+                             self.model._name, record_id, err)
+                self.env.invalidate_all()
+                clear_job_caches(self.env)
+                postponed.append((record_id, err.seconds))
+                continue
+            except Exception:
+                _logger.info('Import of %s %s failed in the chunk, delaying '
+                             'it alone', self.model._name, record_id,
+                             exc_info=True)
+                self.env.invalidate_all()
+                clear_job_caches(self.env)
+                failed.append(record_id)
+                continue
+            if skip:
+                skipped.append(record_id)
+            else:
+                imported.append(record_id)
+        for record_id in failed:
+            self._import_record(record_id, **kwargs)
+        for record_id, seconds in postponed:
+            self._import_record(record_id, eta=seconds, **kwargs)
+        return _('%d imported, %d skipped, %d postponed, %d failed and '
+                 'delayed separately (%s)') % (len(imported), len(skipped),
+                                               len(postponed), len(failed),
+                                               failed)
+
+
+class TranslatedRecord(Mapping):
+    """ Read-only view of a record with the values of one language
+
+    The values of the translatable fields are looked up in ``values``, the
+    other ones in the record, which is not copied.
+    """
+
+    def __init__(self, record, values):
+        self._record = record
+        self._values = values
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        return self._record[key]
+
+    def __iter__(self):
+        for key in self._record:
+            yield key
+        for key in self._values:
+            if key not in self._record:
+                yield key
+
+    def __len__(self):
+        return len(set(self._record) | set(self._values))
+
 
 class TranslatableRecordImporter(PrestashopImporter):
     """ Import one translatable record """
@@ -385,7 +639,17 @@ class TranslatableRecordImporter(PrestashopImporter):
         erp_language = language_binder.to_internal(prestashop_id)
         return erp_language
 
+    def _get_language_codes(self):
+        """ Return the codes of the Odoo languages by PrestaShop id
+
+        The mapping is cached by ``prestashop.res.lang`` for all the jobs.
+        """
+        return self.env['prestashop.res.lang']._get_language_codes(
+            self.backend_record.id
+        )
+
     def find_each_language(self, record):
+        codes = self._get_language_codes()
         languages = {}
         for field in self._translatable_fields[self.connector_env.model_name]:
             # TODO FIXME in prestapyt
@@ -394,9 +658,9 @@ class TranslatableRecordImporter(PrestashopImporter):
             for language in record[field]['language']:
                 if not language or language['attrs']['id'] in languages:
                     continue
-                erp_lang = self._get_odoo_language(language['attrs']['id'])
-                if erp_lang:
-                    languages[language['attrs']['id']] = erp_lang.code
+                code = codes.get(language['attrs']['id'])
+                if code:
+                    languages[language['attrs']['id']] = code
         return languages
 
     def _split_per_language(self, record, fields=None):
@@ -423,8 +687,9 @@ class TranslatableRecordImporter(PrestashopImporter):
                   'Run "Synchronize base data".')
             )
         model_name = self.connector_env.model_name
-        for language_id, language_code in languages.iteritems():
-            split_record[language_code] = record.copy()
+        # values of the translatable fields per language
+        split_values = dict((language_code, {})
+                            for language_code in languages.itervalues())
         _fields = self._translatable_fields[model_name]
         if fields:
             _fields = [x for x in _fields if x in fields]
@@ -444,7 +709,9 @@ class TranslatableRecordImporter(PrestashopImporter):
                           'with id "%s". Run "Synchronize base data" again.') %
                         (current_id,)
                     )
-                split_record[code][field] = language['value']
+                split_values[code][field] = language['value']
+        for code, values in split_values.iteritems():
+            split_record[code] = TranslatedRecord(record, values)
         return split_record
 
     def _create_context(self):
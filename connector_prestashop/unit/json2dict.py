@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+"""
+Convert the records returned by the webservice with ``output_format=JSON``
+to the structure returned by ``prestapyt.xml2dict`` for the XML output, so
+the mappers work the same with both formats.
+
+XML (xml2dict)::
+
+    {'id': '1',
+     'type': {'attrs': {'notFilterable': 'true'}, 'value': 'simple'},
+     'name': {'language': [{'attrs': {'id': '1'}, 'value': 'Shirt'},
+                           {'attrs': {'id': '2'}, 'value': 'Chemise'}]},
+     'associations': {
+         'categories': {'attrs': {'nodeType': 'category',
+                                  'api': 'categories'},
+                        'category': [{'id': '2'}, {'id': '3'}]}}}
+
+JSON::
+
+    {"id": 1,
+     "type": "simple",
+     "name": [{"id": "1", "value": "Shirt"}, {"id": "2", "value": "Chemise"}],
+     "associations": {"categories": [{"id": "2"}, {"id": "3"}]}}
+"""
+
+# name of the association in the record: key of its nodes, to give to
+# ``prestashop.backend.get_version_ps_key``
+ASSOCIATION_KEYS = {
+    'accessories': 'product',
+    'categories': 'category',
+    'combinations': 'combinations',
+    'customer_messages': 'customer_message',
+    'groups': 'group',
+    'images': 'image',
+    'order_rows': 'order_row',
+    'order_slip_details': 'order_slip_detail',
+    'product_bundle': 'product',
+    'product_features': 'product_features',
+    'product_option_values': 'product_option_value',
+    'stock_availables': 'stock_available',
+    'tags': 'tag',
+    'taxes': 'tax',
+}
+
+
+def _to_string(value):
+    """ xml2dict returns all the values as strings """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long, float)):
+        return unicode(value)
+    return value
+
+
+def _one_or_list(items):
+    """ xml2dict returns a dict for a single node, a list otherwise """
+    if len(items) == 1:
+        return items[0]
+    return items
+
+
+def _is_translated(value):
+    return (
+        isinstance(value, list) and value and
+        all(isinstance(item, dict) and set(item) == set(['id', 'value'])
+            for item in value)
+    )
+
+
+def _convert_languages(value):
+    languages = [
+        {'attrs': {'id': _to_string(item['id'])},
+         'value': _to_string(item['value'])}
+        for item in value
+    ]
+    return {'language': _one_or_list(languages)}
+
+
+def _convert_association(name, items, node_key):
+    if isinstance(items, dict):
+        items = [items]
+    association = {'attrs': {'nodeType': node_key, 'api': name}}
+    if not items:
+        association['value'] = ''
+        return association
+    association[node_key] = _one_or_list([
+        dict((field, _to_string(value)) for field, value in item.iteritems())
+        for item in items
+    ])
+    return association
+
+
+def json2dict(record, node_key, value_fields=()):
+    """ Convert a record of the JSON output
+
+    :param record: record decoded from the JSON response
+    :param node_key: function returning the key of the nodes of an
+                     association from its name
+    :param value_fields: fields having attributes in the XML output, they
+                         are converted to ``{'attrs': ..., 'value': ...}``
+    :rtype: dict
+    """
+    result = {}
+    for field, value in record.iteritems():
+        if field == 'associations' and isinstance(value, dict):
+            result[field] = dict(
+                (name, _convert_association(name, items, node_key(name)))
+                for name, items in value.iteritems()
+            )
+        elif _is_translated(value):
+            result[field] = _convert_languages(value)
+        elif field in value_fields:
+            result[field] = {'attrs': {'notFilterable': 'true'},
+                             'value': _to_string(value)}
+        else:
+            result[field] = _to_string(value)
+    return result
@@ -1,9 +1,54 @@
 # -*- coding: utf-8 -*-
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from odoo.addons.connector.connector import pg_try_advisory_lock
 from odoo.addons.connector.unit.mapper import ExportMapper
 from odoo.addons.connector.unit.mapper import mapping
 
+
+def unique_name(unit, model_name, field_name, basename, domain=None,
+                reusable=None):
+    """ Return ``basename``, or ``basename_<n>`` with the first free ``n``
+    when it is already used
+
+    The names starting with ``basename`` are read with one query. The name
+    returned is locked with an advisory lock until the end of the
+    transaction, so a concurrent job allocating the same name, from the
+    same base name or as a literal name, takes the next free one.
+
+    :param unit: connector unit importing the record
+    :param model_name: model holding the names
+    :param field_name: field holding the names
+    :param basename: name to use when it is free
+    :param domain: domain restricting the records to consider
+    :param reusable: optional function receiving the records using the
+                     names, returning the ones whose name can be used
+                     anyway
+    :rtype: unicode
+    """
+    pattern = (basename.replace('\\', '\\\\')
+                       .replace('%', '\\%')
+                       .replace('_', '\\_'))
+    domain = (domain or []) + [(field_name, '=like', pattern + '%')]
+    records = unit.env[model_name].search(domain)
+    if reusable and records:
+        records -= reusable(records)
+    used = set(records.mapped(field_name))
+    name = basename
+    index = 0
+    while True:
+        if name not in used:
+            lock_name = u'unique_name({}, {}, {}, {})'.format(
+                unit.backend_record.company_id.id, model_name, field_name,
+                name,
+            )
+            if pg_try_advisory_lock(unit.env, lock_name.encode('utf-8')):
+                return name
+            # being allocated by a concurrent job
+        index += 1
+        name = u'%s_%d' % (basename, index)
+
+
 class PrestashopExportMapper(ExportMapper):
 
     def _map_direct(self, record, from_attr, to_attr):